@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Compares the rbf extension with its NumPy version
+# (simmycloud/modules/custom/lib/numpy_rbf.py) on random windows.
+#
+# usage: python3 parity.py [rows] [window...]
+#
+# The extension must be installed at simmycloud/modules/custom/lib (see
+# README). Both fit the same model, in the same order of operations and
+# with libm's exp, so the forecasts must be bit-identical: any difference is
+# a mismatch (ill-conditioned fits amplify a last-bit difference way beyond
+# any tolerance). The batched predict_many is compared on every row and
+# predict on the first SINGLE_ROWS ones, errors included.
+#
+# Only the rows both fit are compared. At windows of 10 values or less (the
+# default rbf_time_series_prediction_window_size included) the 10 centers
+# and the constant have fewer points to be fitted to than unknowns, so no
+# row is fitted and nothing is compared: such a window is reported and
+# fails the check.
+
+import array
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simmycloud'))
+
+import modules.custom.lib.rbf as rbf
+import modules.custom.lib.numpy_rbf as numpy_rbf
+
+SINGLE_ROWS = 100
+
+def random_windows(rows, window):
+    windows = []
+    for i in range(rows):
+        kind = random.random()
+        if kind < 0.03:
+            windows.append([0.3] * window)
+        elif kind < 0.06:
+            windows.append([random.choice([0.1, 0.2]) for j in range(window)])
+        else:
+            windows.append([random.random() * random.random() for j in range(window)])
+    return windows
+
+def single_prediction(module, window):
+    try:
+        return module.predict(window)
+    except Exception as e:
+        return '{}: {}'.format(type(e).__name__, e)
+
+def compare(rows, window):
+    # the same windows whichever other windows are compared
+    random.seed(0)
+    windows = random_windows(rows, window)
+    values = array.array('d', [v for w in windows for v in w])
+
+    start = time.perf_counter()
+    expected = rbf.predict_many(values, window)
+    c_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = numpy_rbf.predict_many(values, window)
+    numpy_time = time.perf_counter() - start
+
+    mismatches = 0
+    compared = 0
+    max_error = 0.0
+    for a, b in zip(expected, got):
+        if math.isnan(a) or math.isnan(b):
+            mismatches += math.isnan(a) != math.isnan(b)
+            continue
+        compared += 1
+        max_error = max(max_error, abs(a - b) / max(abs(a), sys.float_info.min))
+        mismatches += a != b
+    mismatches += sum(single_prediction(rbf, w) != single_prediction(numpy_rbf, w)
+                      for w in windows[:SINGLE_ROWS])
+
+    if compared == 0:
+        print('window {:3d}: {} rows, no rows compared: no model could be fitted'.format(window, rows))
+        return False
+
+    print('window {:3d}: {} rows, {} not fitted, {} compared, {} mismatches, max relative error {:.2e}, '
+          'c {:.3f}s, numpy {:.3f}s'.format(window, rows, sum(map(math.isnan, expected)), compared,
+                                            mismatches, max_error, c_time, numpy_time))
+    return mismatches == 0
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    windows = [int(w) for w in sys.argv[2:]] or [20, 30, 50]
+    results = [compare(rows, window) for window in windows]
+    sys.exit(0 if all(results) else 1)
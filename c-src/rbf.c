@@ -35,64 +35,71 @@
 #else
 #endif
 
-char *outfile=NULL,stdo=1,MAKECAST=0;
-char *infile=NULL;
-char setdrift=1;
-int DIM=2,DELAY=1,CENTER=10,STEP=1;
-unsigned int COLUMN=1;
-unsigned int verbosity=0xff;
-long CLENGTH=1000;
-unsigned long LENGTH=ULONG_MAX,INSAMPLE=ULONG_MAX,exclude=0;
-
-double *series,*coefs;
-double varianz,interval,min;
-double **center;
-
-#define pycheck_alloc(pnt)      \
-  do {                          \
-    if ((pnt) == NULL)          \
-      return PyErr_NoMemory();  \
-  } while(0)
-
-double avdistance(void)
+/* Default parameters, as in the command line tool: -m2 -d1 -p10 -s1 -L1 */
+static const char MAKECAST=1;
+static const char setdrift=1;
+static const int DIM=2,DELAY=1,CENTER=10,STEP=1;
+static const unsigned long INSAMPLE=ULONG_MAX;
+
+/* Error codes of the fit. The numeric code calls no Python API, so that it
+   can run without the GIL; errors are turned into exceptions afterwards. */
+#define RBF_OK 0
+#define RBF_NO_MEMORY 1
+#define RBF_CONSTANT_DATA 2
+#define RBF_ZERO_VARIANCE 3
+#define RBF_SINGULAR_MATRIX 4
+
+/* State of one fit. Each call has its own, so that fits can run
+   concurrently. */
+typedef struct {
+  int dim,delay,centers,step;
+  unsigned long length,insample;
+  double *series,*coefs;
+  double **center;
+  double varianz,interval,min;
+} rbf_context;
+
+double avdistance(rbf_context *ctx)
 {
   int i,j,k;
   double dist=0.0;
 
-  for (i=0;i<CENTER;i++)
-    for (j=0;j<CENTER;j++)
+  for (i=0;i<ctx->centers;i++)
+    for (j=0;j<ctx->centers;j++)
       if (i != j)
-        for (k=0;k<DIM;k++)
-          dist += sqr(center[i][k]-center[j][k]);
+        for (k=0;k<ctx->dim;k++)
+          dist += sqr(ctx->center[i][k]-ctx->center[j][k]);
 
-  return sqrt(dist/(CENTER-1)/CENTER/DIM);
+  return sqrt(dist/(ctx->centers-1)/ctx->centers/ctx->dim);
 }
 
-double rbf(double *act,double *cen)
+double rbf(rbf_context *ctx,double *act,double *cen)
 {
-  static double denum;
+  double denum;
   double r=0;
   int i;
 
-  denum=2.0*varianz*varianz;
+  denum=2.0*ctx->varianz*ctx->varianz;
 
-  for (i=0;i<DIM;i++)
-    r += sqr(*(act-i*DELAY)-cen[i]);
+  for (i=0;i<ctx->dim;i++)
+    r += sqr(*(act-i*ctx->delay)-cen[i]);
 
   return exp(-r/denum);
 }
 
-void drift(void)
+int drift(rbf_context *ctx)
 {
   double *force,h,h1,step=1e-2,step1;
-  int i,j,k,l,d2=DIM;
+  int i,j,k,l,d2=ctx->dim;
+  double **center=ctx->center;
 
-  pycheck_alloc(force=(double*)PyMem_RawMalloc(sizeof(double)*d2));
+  if ((force=(double*)PyMem_RawMalloc(sizeof(double)*d2)) == NULL)
+    return RBF_NO_MEMORY;
   for (l=0;l<20;l++) {
-    for (i=0;i<CENTER;i++) {
+    for (i=0;i<ctx->centers;i++) {
       for (j=0;j<d2;j++) {
         force[j]=0.0;
-        for (k=0;k<CENTER;k++) {
+        for (k=0;k<ctx->centers;k++) {
           if (k != i) {
             h=center[i][j]-center[k][j];
             force[j] += h/sqr(h)/fabs(h);
@@ -111,42 +118,50 @@ void drift(void)
     }
   }
   PyMem_RawFree(force);
+  return RBF_OK;
 }
 
-void make_fit(void)
+int make_fit(rbf_context *ctx)
 {
   double **mat,*hcen;
   double h;
-  int i,j,n,nst;
-
-  pycheck_alloc(mat=(double**)PyMem_RawMalloc(sizeof(double*)*(CENTER+1)));
-  for (i=0;i<=CENTER;i++)
-    pycheck_alloc(mat[i]=(double*)PyMem_RawMalloc(sizeof(double)*(CENTER+1)));
-  pycheck_alloc(hcen=(double*)PyMem_RawMalloc(sizeof(double)*CENTER));
-
-  for (i=0;i<=CENTER;i++) {
+  double *series=ctx->series,*coefs=ctx->coefs;
+  int i,j,n,nst,code=RBF_OK;
+  int centers=ctx->centers;
+
+  if ((mat=(double**)PyMem_RawCalloc(centers+1,sizeof(double*))) == NULL)
+    return RBF_NO_MEMORY;
+  if ((hcen=(double*)PyMem_RawMalloc(sizeof(double)*centers)) == NULL)
+    code=RBF_NO_MEMORY;
+  for (i=0;i<=centers && code == RBF_OK;i++)
+    if ((mat[i]=(double*)PyMem_RawMalloc(sizeof(double)*(centers+1))) == NULL)
+      code=RBF_NO_MEMORY;
+  if (code != RBF_OK)
+    goto free_all;
+
+  for (i=0;i<=centers;i++) {
     coefs[i]=0.0;
-    for (j=0;j<=CENTER;j++)
+    for (j=0;j<=centers;j++)
       mat[i][j]=0.0;
   }
 
-  for (n=(DIM-1)*DELAY;n<INSAMPLE-STEP;n++) {
-    nst=n+STEP;
-    for (i=0;i<CENTER;i++)
-      hcen[i]=rbf(&series[n],center[i]);
+  for (n=(ctx->dim-1)*ctx->delay;n<ctx->insample-ctx->step;n++) {
+    nst=n+ctx->step;
+    for (i=0;i<centers;i++)
+      hcen[i]=rbf(ctx,&series[n],ctx->center[i]);
     coefs[0] += series[nst];
     mat[0][0] += 1.0;
-    for (i=1;i<=CENTER;i++)
+    for (i=1;i<=centers;i++)
       mat[i][0] += hcen[i-1];
-    for (i=1;i<=CENTER;i++) {
+    for (i=1;i<=centers;i++) {
       coefs[i] += series[nst]*(h=hcen[i-1]);
       for (j=1;j<=i;j++)
         mat[i][j] += h*hcen[j-1];
     }
   }
 
-  h=(double)(INSAMPLE-STEP-(DIM-1)*DELAY);
-  for (i=0;i<=CENTER;i++) {
+  h=(double)(ctx->insample-ctx->step-(ctx->dim-1)*ctx->delay);
+  for (i=0;i<=centers;i++) {
     coefs[i] /= h;
     for (j=0;j<=i;j++) {
       mat[i][j] /= h;
@@ -154,15 +169,15 @@ void make_fit(void)
     }
   }
 
-  solvele(mat,coefs,(unsigned int)(CENTER+1));
-  if(PyErr_Occurred()) {
-    return;
-  }
+  if (solvele(mat,coefs,(unsigned int)(centers+1)) < 0)
+    code=RBF_SINGULAR_MATRIX;
 
-  for (i=0;i<=CENTER;i++)
+free_all:
+  for (i=0;i<=centers;i++)
     PyMem_RawFree(mat[i]);
   PyMem_RawFree(mat);
   PyMem_RawFree(hcen);
+  return code;
 }
 
 /* double forecast_error(unsigned long i0,unsigned long i1) */
@@ -201,88 +216,32 @@ void make_fit(void)
 /*   } */
 /* } */
 
-static PyObject *
-predict(PyObject *self, PyObject *args)
+/* Fits the model to the ctx->length values at ctx->series, which are
+   rescaled in place, and forecasts the next value. Needs no GIL. */
+static int
+forecast(rbf_context *ctx,double *prediction)
 {
-  char stdi=1;
-  int i,j,cstep;
-  double av;
-  double prediction;
-
-  PyObject *tuple;
-  PyObject *seq;
-
-  if (!PyArg_ParseTuple(args, "O", &tuple))
-    return NULL;
-
-  // Input variables
-  //
-  // LENGTH = ;
-  // exclude = ;
-  // COLUMN = ;
-  // DIM = ;
-  // DELAY = ;
-  // CENTER = ;
-  // setdrift=0;
-  // STEP = ;
-  // verbosity = ;
-  // INSAMPLE = ;
-  // stdo=0; outfile="out";
-
-  // -L 1
-  MAKECAST = 1; CLENGTH = 1;
-
-  seq = PySequence_Fast(tuple, "argument must be a list or tuple");
-  if(!seq)
-    return NULL;
-
-  LENGTH = PySequence_Fast_GET_SIZE(seq);
-
-  // series=(double*)get_series(infile,&LENGTH,exclude,COLUMN,verbosity);
-  pycheck_alloc(series = (double*) PyMem_RawMalloc(sizeof(double)*LENGTH));
-
-  for(i=0; i<LENGTH; i++) {
-    PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
-    series[i] = PyFloat_AS_DOUBLE(PyNumber_Float(item));
-  }
-  Py_DECREF(seq);
-
-  rescale_data(series,LENGTH,&min,&interval);
-  if(PyErr_Occurred()) {
-    PyMem_RawFree(series);
-    return NULL;
-  }
-
-  variance(series,LENGTH,&av,&varianz);
-  if(PyErr_Occurred()) {
-    PyMem_RawFree(series);
-    return NULL;
-  }
-
-  if (INSAMPLE > LENGTH)
-    INSAMPLE=LENGTH;
+  int i,j,cstep,code;
+  double av,new_el;
+  double *series=ctx->series;
 
-  if (CENTER > LENGTH)
-    CENTER = LENGTH;
+  if (rescale_data(series,ctx->length,&ctx->min,&ctx->interval) < 0)
+    return RBF_CONSTANT_DATA;
 
-  if (MAKECAST)
-    STEP=1;
+  if (variance(series,ctx->length,&av,&ctx->varianz) < 0)
+    return RBF_ZERO_VARIANCE;
 
-  pycheck_alloc(coefs=(double*)PyMem_RawMalloc(sizeof(double)*(CENTER+1)));
-  pycheck_alloc(center=(double**)PyMem_RawMalloc(sizeof(double*)*CENTER));
-  for (i=0;i<CENTER;i++)
-    pycheck_alloc(center[i]=(double*)PyMem_RawMalloc(sizeof(double)*DIM));
+  cstep=ctx->length-1-(ctx->dim-1)*ctx->delay;
+  for (i=0;i<ctx->centers;i++)
+    for (j=0;j<ctx->dim;j++)
+      ctx->center[i][j]=series[(ctx->dim-1)*ctx->delay-j*ctx->delay+(i*cstep)/(ctx->centers-1)];
 
-  cstep=LENGTH-1-(DIM-1)*DELAY;
-  for (i=0;i<CENTER;i++)
-    for (j=0;j<DIM;j++)
-      center[i][j]=series[(DIM-1)*DELAY-j*DELAY+(i*cstep)/(CENTER-1)];
+  if (setdrift && (code=drift(ctx)) != RBF_OK)
+    return code;
 
-  if (setdrift)
-    drift();
-
-  varianz=avdistance();
-  make_fit();
+  ctx->varianz=avdistance(ctx);
+  if ((code=make_fit(ctx)) != RBF_OK)
+    return code;
 
   /* if (!stdo) { */
   /*   file=fopen(outfile,"w"); */
@@ -355,45 +314,221 @@ predict(PyObject *self, PyObject *args)
   /* if (!stdo) */
   /*   fclose(file); */
 
-  /* make_cast() */
-  {
-    double *cast,new_el;
-    int i,dim;
-
-    dim=(DIM-1)*DELAY;
-    pycheck_alloc(cast=(double*)PyMem_RawMalloc(sizeof(double)*(dim+1)));
-    for (i=0;i<=dim;i++)
-      cast[i]=series[LENGTH-1-dim+i];
-
-    new_el=coefs[0];
-    for (i=1;i<=CENTER;i++)
-      new_el += coefs[i]*rbf(&cast[dim],center[i-1]);
-
-    PyMem_RawFree(cast);
-
-    prediction = new_el*interval+min;
-    if(PyErr_Occurred()) {
-      for (i=0;i<CENTER;i++)
-        PyMem_RawFree(center[i]);
-      PyMem_RawFree(center);
-      PyMem_RawFree(coefs);
-      PyMem_RawFree(series);
+  /* make_cast(): a single step. The last (DIM-1)*DELAY+1 values of the
+     series are the ones the command line tool copies to cast[] */
+  new_el=ctx->coefs[0];
+  for (i=1;i<=ctx->centers;i++)
+    new_el += ctx->coefs[i]*rbf(ctx,&series[ctx->length-1],ctx->center[i-1]);
+
+  *prediction = new_el*ctx->interval+ctx->min;
+  return RBF_OK;
+}
+
+static void
+free_context(rbf_context *ctx)
+{
+  int i;
+
+  if (ctx->center != NULL)
+    for (i=0;i<ctx->centers;i++)
+      PyMem_RawFree(ctx->center[i]);
+  PyMem_RawFree(ctx->center);
+  PyMem_RawFree(ctx->coefs);
+  PyMem_RawFree(ctx->series);
+  ctx->center = NULL;
+  ctx->coefs = ctx->series = NULL;
+}
+
+/* Sets the parameters for series of the given length and allocates the
+   context's buffers. Needs no GIL. */
+static int
+alloc_context(rbf_context *ctx,unsigned long length)
+{
+  int i;
+
+  ctx->dim = DIM;
+  ctx->delay = DELAY;
+  ctx->length = length;
+  ctx->insample = INSAMPLE > length ? length : INSAMPLE;
+  ctx->centers = CENTER > length ? (int)length : CENTER;
+  ctx->step = MAKECAST ? 1 : STEP;
+
+  ctx->series = (double*) PyMem_RawMalloc(sizeof(double)*length);
+  ctx->coefs = (double*) PyMem_RawMalloc(sizeof(double)*(ctx->centers+1));
+  ctx->center = (double**) PyMem_RawCalloc(ctx->centers, sizeof(double*));
+  if (ctx->series == NULL || ctx->coefs == NULL || ctx->center == NULL)
+    goto no_memory;
+  for (i=0;i<ctx->centers;i++)
+    if ((ctx->center[i]=(double*)PyMem_RawMalloc(sizeof(double)*ctx->dim)) == NULL)
+      goto no_memory;
+  return RBF_OK;
+
+no_memory:
+  free_context(ctx);
+  return RBF_NO_MEMORY;
+}
+
+/* Sets the Python exception of an error code. Needs the GIL. */
+static void
+set_error(rbf_context *ctx,int code)
+{
+  char *from,*to;
+
+  switch (code) {
+  case RBF_NO_MEMORY:
+    PyErr_NoMemory();
+    break;
+  case RBF_CONSTANT_DATA:
+    from = PyOS_double_to_string(ctx->min, 'r', 0, Py_DTSF_ADD_DOT_0, NULL);
+    to = PyOS_double_to_string(ctx->min + ctx->interval, 'r', 0, Py_DTSF_ADD_DOT_0, NULL);
+    if (from != NULL && to != NULL)
+      PyErr_Format(PyExc_RuntimeError, "rescale_data: data ranges from %s to %s. It makes no sense to continue.",from,to);
+    PyMem_Free(from);
+    PyMem_Free(to);
+    break;
+  case RBF_ZERO_VARIANCE:
+    PyErr_SetString(PyExc_RuntimeError, "Variance of the data is zero.");
+    break;
+  case RBF_SINGULAR_MATRIX:
+    PyErr_SetString(PyExc_RuntimeError, "Singular matrix! Exiting!\n");
+    break;
+  }
+}
+
+static PyObject *
+predict(PyObject *self, PyObject *args)
+{
+  Py_ssize_t i,length;
+  int code;
+  double prediction;
+  rbf_context ctx;
+
+  PyObject *tuple;
+  PyObject *seq;
+
+  if (!PyArg_ParseTuple(args, "O", &tuple))
+    return NULL;
+
+  seq = PySequence_Fast(tuple, "argument must be a list or tuple");
+  if(!seq)
+    return NULL;
+
+  length = PySequence_Fast_GET_SIZE(seq);
+  if (length < 2) {
+    Py_DECREF(seq);
+    PyErr_SetString(PyExc_ValueError, "at least 2 values are needed");
+    return NULL;
+  }
+
+  if ((code = alloc_context(&ctx, length)) != RBF_OK) {
+    Py_DECREF(seq);
+    set_error(&ctx, code);
+    return NULL;
+  }
+
+  for(i=0; i<length; i++) {
+    ctx.series[i] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(seq, i));
+    if (ctx.series[i] == -1.0 && PyErr_Occurred()) {
+      Py_DECREF(seq);
+      free_context(&ctx);
       return NULL;
     }
   }
+  Py_DECREF(seq);
+
+  Py_BEGIN_ALLOW_THREADS
+  code = forecast(&ctx, &prediction);
+  Py_END_ALLOW_THREADS
+
+  if (code != RBF_OK)
+    set_error(&ctx, code);
+  free_context(&ctx);
+  if (code != RBF_OK)
+    return NULL;
+
+  return PyFloat_FromDouble(prediction);
+}
+
+#define PREDICT_MANY_STR "predict_many(values, window=0)\n\n" \
+  "Fits a RBF-model to each row of values and forecasts its next value.\n" \
+  "values is a C-contiguous buffer of doubles (e.g. array.array('d')),\n" \
+  "holding the rows one after the other. window is the length of the rows,\n" \
+  "taken from the buffer's shape when it is 2-D and window is 0.\n" \
+  "Returns a list with a prediction for each row, NaN for the rows whose\n" \
+  "model could not be fitted. The GIL is released while fitting."
+
+static PyObject *
+predict_many(PyObject *self, PyObject *args)
+{
+  Py_buffer view;
+  Py_ssize_t window=0,rows,row;
+  int code=RBF_OK;
+  double *predictions;
+  rbf_context ctx;
+  PyObject *values,*list,*value;
+
+  if (!PyArg_ParseTuple(args, "O|n", &values, &window))
+    return NULL;
+
+  if (PyObject_GetBuffer(values, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+    return NULL;
+
+  if (view.format == NULL || strcmp(view.format, "d") != 0) {
+    PyErr_SetString(PyExc_TypeError, "values must be a buffer of doubles");
+    PyBuffer_Release(&view);
+    return NULL;
+  }
+  if (window == 0 && view.ndim == 2)
+    window = view.shape[1];
+  rows = window > 0 ? view.len / view.itemsize / window : 0;
+  if (window < 2 || rows * window * view.itemsize != view.len) {
+    PyErr_SetString(PyExc_ValueError, "values must hold rows of window >= 2 doubles");
+    PyBuffer_Release(&view);
+    return NULL;
+  }
 
-  for (i=0;i<CENTER;i++)
-    PyMem_RawFree(center[i]);
-  PyMem_RawFree(center);
-  PyMem_RawFree(coefs);
-  PyMem_RawFree(series);
+  predictions = (double*) PyMem_RawMalloc(sizeof(double)*(rows > 0 ? rows : 1));
+  if (predictions == NULL) {
+    PyBuffer_Release(&view);
+    return PyErr_NoMemory();
+  }
 
-  return Py_BuildValue("d", prediction);
+  Py_BEGIN_ALLOW_THREADS
+  code = alloc_context(&ctx, window);
+  for (row=0; row<rows && code == RBF_OK; row++) {
+    memcpy(ctx.series, (double*)view.buf + row*window, sizeof(double)*window);
+    code = forecast(&ctx, &predictions[row]);
+    if (code != RBF_OK && code != RBF_NO_MEMORY) {
+      predictions[row] = Py_NAN;
+      code = RBF_OK;
+    }
+  }
+  if (code == RBF_OK)
+    free_context(&ctx);
+  Py_END_ALLOW_THREADS
+
+  PyBuffer_Release(&view);
+  if (code != RBF_OK) {
+    PyMem_RawFree(predictions);
+    free_context(&ctx);
+    return PyErr_NoMemory();
+  }
+
+  list = PyList_New(rows);
+  for (row=0; list != NULL && row<rows; row++) {
+    if ((value = PyFloat_FromDouble(predictions[row])) == NULL)
+      Py_CLEAR(list);
+    else
+      PyList_SET_ITEM(list, row, value);
+  }
+  PyMem_RawFree(predictions);
+  return list;
 }
 
 static PyMethodDef RbfMethods[] =
 {
      {"predict", predict, METH_VARARGS, WID_STR},
+     {"predict_many", predict_many, METH_VARARGS, PREDICT_MANY_STR},
      {NULL, NULL, 0, NULL}
 };
 
@@ -31,7 +31,7 @@ double **invert_matrix(double **mat,unsigned int size)
 {
   int i,j,k;
   double **hmat,**imat,*vec;
-  extern void solvele(double**,double*,unsigned int);
+  extern int solvele(double**,double*,unsigned int);
 
   check_alloc(hmat=(double**)malloc(sizeof(double*)*size));
   for (i=0;i<size;i++) {
@@ -43,7 +43,7 @@
 #include <time.h>
 #endif
 
-extern void rescale_data(double*,unsigned long,double*,double*);
+extern int rescale_data(double*,unsigned long,double*,double*);
 extern void check_alloc(void*);
 extern unsigned long rnd_long(void);
 extern void  rnd_init(unsigned long);
@@ -26,7 +26,7 @@
 #include "tisean_cec.h"
 #include <stdlib.h>
 
-void rescale_data(double *x,unsigned long l,double *min,double *interval)
+int rescale_data(double *x,unsigned long l,double *min,double *interval)
 {
   int i;
   
@@ -38,13 +38,11 @@ void rescale_data(double *x,unsigned long l,double *min,double *interval)
   }
   *interval -= *min;
 
-  if (*interval != 0.0) {
-    for (i=0;i<l;i++)
-      x[i]=(x[i]- *min)/ *interval;
-  }
-  else {
-    char *m  = PyOS_double_to_string(*min,             'r', 0, Py_DTSF_ADD_DOT_0, NULL);
-    char *mi = PyOS_double_to_string(*min + *interval, 'r', 0, Py_DTSF_ADD_DOT_0, NULL);
-    PyErr_Format(PyExc_RuntimeError, "rescale_data: data ranges from %s to %s. It makes no sense to continue.",m,mi);
-  }
+  /* the caller reports the error: no Python calls, it may run without the GIL */
+  if (*interval == 0.0)
+    return -1;
+
+  for (i=0;i<l;i++)
+    x[i]=(x[i]- *min)/ *interval;
+  return 0;
 }
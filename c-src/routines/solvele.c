@@ -23,7 +23,7 @@
 #include <math.h>
 #include "tisean_cec.h"
 
-void solvele(double **mat,double *vec,unsigned int n)
+int solvele(double **mat,double *vec,unsigned int n)
 {
   double vswap,*mswap,*hvec,max,h,pivot,q;
   int i,j,k,maxi;
@@ -47,10 +47,10 @@ void solvele(double **mat,double *vec,unsigned int n)
     
     hvec=mat[i];
     pivot=hvec[i];
-    if (fabs(pivot) == 0.0) {
-      PyErr_SetString(PyExc_RuntimeError, "Singular matrix! Exiting!\n");
-      return;
-    }
+    /* singular matrix. The caller reports the error: no Python calls, it
+       may run without the GIL */
+    if (fabs(pivot) == 0.0)
+      return -1;
     for (j=i+1;j<n;j++) {
       q= -mat[j][i]/pivot;
       mat[j][i]=0.0;
@@ -66,4 +66,5 @@ void solvele(double **mat,double *vec,unsigned int n)
       vec[i] -= hvec[j]*vec[j];
     vec[i] /= hvec[i];
   }
+  return 0;
 }
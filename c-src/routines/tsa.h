@@ -55,8 +55,8 @@ extern double *get_series(char *,unsigned long *,unsigned long,
 		       unsigned int,unsigned int);
 extern double **get_multi_series(char *,unsigned long *,unsigned long,
 				 unsigned int *,char *,char,unsigned int);
-extern void rescale_data(double *,unsigned long,double *,double *);
-extern void variance(double *,unsigned long,double *,double *);
+extern int rescale_data(double *,unsigned long,double *,double *);
+extern int variance(double *,unsigned long,double *,double *);
 extern void make_box(double *,long **,long *,unsigned long,
 			unsigned int,unsigned int,unsigned int,double);
 extern unsigned long find_neighbors(double *,long **,long *,double *,
@@ -64,7 +64,7 @@ extern unsigned long find_neighbors(double *,long **,long *,double *,
 				    unsigned int,double,unsigned long *);
 extern char* search_datafile(int, char**,unsigned int*,unsigned int);
 extern char* check_option(char**,int,int,int);
-extern void  solvele(double**,double *,unsigned int);
+extern int  solvele(double**,double *,unsigned int);
 extern void test_outfile(char*);
 extern double** invert_matrix(double**,unsigned int);
 extern unsigned long exclude_interval(unsigned long,long,long,
@@ -23,7 +23,7 @@
 #include <math.h>
 #include "tisean_cec.h"
 
-void variance(double *s,unsigned long l,double *av,double *var)
+int variance(double *s,unsigned long l,double *av,double *var)
 {
   unsigned long i;
   double h;
@@ -37,8 +37,9 @@ void variance(double *s,unsigned long l,double *av,double *var)
   }
   *av /= (double)l;
   *var=sqrt(fabs((*var)/(double)l-(*av)*(*av)));
-  if (*var == 0.0) {
-    PyErr_SetString(PyExc_RuntimeError, "Variance of the data is zero.");
-  }
+  /* the caller reports the error: no Python calls, it may run without the GIL */
+  if (*var == 0.0)
+    return -1;
+  return 0;
 }
 
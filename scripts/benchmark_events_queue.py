@@ -0,0 +1,94 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Compares the heapq EventsQueue with the CalendarEventsQueue. The queue is
+# filled with pending FINISH events, then the simulation loop is mimicked:
+# the next batch of events is removed and, for each removed event, a new one
+# is added some timestamps ahead (hold model).
+
+import os
+import sys
+import random
+import logging
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simmycloud'))
+
+from core.event import EventsQueue, CalendarEventsQueue, EventBuilder
+
+logging.basicConfig(level=logging.INFO)
+
+PENDING_EVENTS = [10000, 100000, 1000000]
+HOLD_OPERATIONS = 100000
+EVENTS_PER_TIMESTAMP = 10
+
+
+class QueueBenchmark:
+    def __init__(self, queue_class, pending_events, events_per_timestamp, seed=0):
+        self._queue_class = queue_class
+        self._pending_events = pending_events
+        self._horizon = max(pending_events // events_per_timestamp, 1)
+        self._seed = seed
+
+    def run(self, hold_operations):
+        random.seed(self._seed)
+        queue = self._new_queue()
+        events = [EventBuilder.build_finish_event(random.randrange(self._horizon), str(i))
+                  for i in range(self._pending_events)]
+
+        start = time.perf_counter()
+        queue.add_events(events)
+        fill_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        operations = 0
+        while operations < hold_operations:
+            batch = queue.next_events()
+            for event in batch:
+                queue.add_event(EventBuilder.build_finish_event(event.time + 1 + random.randrange(self._horizon),
+                                                                event.vm.name))
+            operations += len(batch)
+        hold_time = time.perf_counter() - start
+
+        return fill_time, hold_time / operations
+
+    def _new_queue(self):
+        queue = self._queue_class()
+        queue._logger = logging.getLogger(self._queue_class.__name__)
+        queue._has_submit_events = False
+        return queue
+
+
+# main:
+events_per_timestamp = int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS_PER_TIMESTAMP
+
+print('events per timestamp: {}'.format(events_per_timestamp))
+print('{:>12} {:>20} {:>12} {:>16}'.format('pending', 'queue', 'fill (s)', 'hold (us/event)'))
+for pending_events in PENDING_EVENTS:
+    for queue_class in [EventsQueue, CalendarEventsQueue]:
+        benchmark = QueueBenchmark(queue_class, pending_events, events_per_timestamp)
+        fill_time, hold_time = benchmark.run(HOLD_OPERATIONS)
+        print('{:>12} {:>20} {:>12.3f} {:>16.3f}'.format(pending_events,
+                                                          queue_class.__name__,
+                                                          fill_time,
+                                                          hold_time * 1000000))
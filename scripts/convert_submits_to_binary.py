@@ -0,0 +1,131 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import logging
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simmycloud'))
+
+from core.config import Config
+from core.event import BinarySubmitsFormat, FileSetReader
+
+logging.basicConfig(level=logging.INFO)
+
+
+class BinarySubmitsOutput:
+    def __init__(self, output_file):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        if os.path.exists(output_file):
+            raise Exception("Output file '%s' already exists. Can't convert due to possible conflicts." % output_file)
+        self._output_file = output_file
+        self._timestamps = array(BinarySubmitsFormat.TIMESTAMP)
+        self._process_times = array(BinarySubmitsFormat.PROCESS_TIME)
+        self._cpus = array(BinarySubmitsFormat.CPU)
+        self._mems = array(BinarySubmitsFormat.MEM)
+        self._vm_ids = array(BinarySubmitsFormat.VM_ID)
+        self._vm_names = dict()
+
+    def add_submit(self, timestamp, vm_name, cpu, mem, process_time):
+        vm_id = self._vm_names.get(vm_name)
+        if vm_id is None:
+            vm_id = len(self._vm_names)
+            self._vm_names[vm_name] = vm_id
+        self._timestamps.append(timestamp)
+        self._process_times.append(process_time)
+        self._cpus.append(cpu)
+        self._mems.append(mem)
+        self._vm_ids.append(vm_id)
+
+    def close(self):
+        names = bytearray()
+        name_offsets = array(BinarySubmitsFormat.NAME_OFFSET, [0])
+        for vm_name in self._vm_names.keys():
+            names.extend(vm_name.encode('utf-8'))
+            name_offsets.append(len(names))
+
+        self._logger.info('Writing %d submits (%d distinct VMs) to %s',
+                          len(self._timestamps), len(self._vm_names), self._output_file)
+        with open(self._output_file, 'wb') as out:
+            out.write(BinarySubmitsFormat.HEADER.pack(BinarySubmitsFormat.MAGIC,
+                                                      BinarySubmitsFormat.VERSION,
+                                                      BinarySubmitsFormat.native_byte_order(),
+                                                      len(self._timestamps),
+                                                      len(self._vm_names),
+                                                      len(names)))
+            self._write_column(out, self._timestamps)
+            self._write_column(out, self._process_times)
+            self._write_column(out, self._cpus)
+            self._write_column(out, self._mems)
+            self._write_column(out, self._vm_ids)
+            self._write_column(out, name_offsets)
+            out.write(names)
+
+    def _write_column(self, out, column):
+        self._pad(out)
+        column.tofile(out)
+
+    def _pad(self, out):
+        out.write(b'\0' * (-out.tell() % BinarySubmitsFormat.ALIGNMENT))
+
+
+class SubmitsConverter:
+    def __init__(self, input_directory, output_file):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        # the reader the simulator uses, so that both read the same lines
+        config = Config()
+        config.identifier = 'convert_submits_to_binary'
+        config.params['input_directory'] = input_directory
+        self._fileset = FileSetReader()
+        self._fileset.set_config(config)
+        self._output = BinarySubmitsOutput(output_file)
+
+    def convert(self):
+        self._fileset.initialize()
+
+        line = self._fileset.next_line()
+        while line is not None:
+            if len(line.strip()) > 0:
+                # timestamp,vm_name,cpu,mem,process_time
+                data = line.strip().split(',')
+                self._output.add_submit(int(data[0] if data[0] else 0),
+                                        data[1],
+                                        float(data[2] if data[2] else 0),
+                                        float(data[3] if data[3] else 0),
+                                        int(data[4] if data[4] else 0))
+
+            line = self._fileset.next_line()
+        self._output.close()
+
+
+# main:
+if len(sys.argv) < 3:
+    print('Usage: python3 {} INPUT_DIRECTORY OUTPUT_FILE\n'.format(sys.argv[0]))
+    exit()
+
+input_dir = sys.argv[1]
+output_file = sys.argv[2]
+
+converter = SubmitsConverter(input_dir, output_file)
+converter.convert()
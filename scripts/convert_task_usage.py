@@ -27,9 +27,20 @@ import fileinput
 import re
 import logging
 import sys
+import zlib
+from collections import OrderedDict
 
 logging.basicConfig(level=logging.DEBUG)
 
+# Packed usage archive. Must be kept in sync with
+# simmycloud/modules/custom/measurement_reader.py (PackedMeasurements).
+#
+# task_usage.dat: the usage lines of each VM, stored contiguously
+# task_usage.idx: one 'vm_name,offset,length' line per VM
+PACKED_DATA_FILE = 'task_usage.dat'
+PACKED_INDEX_FILE = 'task_usage.idx'
+SPILL_FILES = 256
+
 
 class FileSetReader:
     def __init__(self):
@@ -93,14 +104,62 @@ class UsageOutput:
         output.write(line + '\n')
         output.close()
 
+    def close(self):
+        pass
+
+
+class PackedUsageOutput:
+    """ Lines are first spilled to a few files, by VM name's hash, so that
+        the lines of a VM can be grouped without holding the whole trace in
+        memory. On close, each spill file is grouped and appended to the
+        packed archive. """
+    def __init__(self, output_directory):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._output_dir = output_directory
+        try:
+            os.makedirs(self._output_dir)
+        except OSError:
+            raise Exception("Output directory '%s' already exists. Can't filter due to possible conflicts." % self._output_dir)
+        self._spill_files = [open(self._spill_filename(i), 'w') for i in range(SPILL_FILES)]
+
+    def print_line_to_vm(self, line, vm_name):
+        spill = zlib.crc32(vm_name.encode('utf-8')) % SPILL_FILES
+        self._spill_files[spill].write('{},{}\n'.format(vm_name, line))
+
+    def close(self):
+        for spill_file in self._spill_files:
+            spill_file.close()
+
+        vms = 0
+        with open('{}/{}'.format(self._output_dir, PACKED_DATA_FILE), 'wb') as data, \
+             open('{}/{}'.format(self._output_dir, PACKED_INDEX_FILE), 'w') as index:
+            for i in range(SPILL_FILES):
+                lines_of_vm = OrderedDict()
+                with open(self._spill_filename(i)) as spill_file:
+                    for line in spill_file:
+                        vm_name, usage = line.split(',', 1)
+                        lines_of_vm.setdefault(vm_name, []).append(usage)
+                os.remove(self._spill_filename(i))
+
+                for vm_name, lines in lines_of_vm.items():
+                    usage = ''.join(lines).encode('utf-8')
+                    index.write('{},{},{}\n'.format(vm_name, data.tell(), len(usage)))
+                    data.write(usage)
+                vms += len(lines_of_vm)
+
+        self._logger.info('Packed usage of %d VMs into %s', vms, self._output_dir)
+
+    def _spill_filename(self, i):
+        return '{}/spill-{}.tmp'.format(self._output_dir, i)
+
 
 class TaskUsageFilterer:
-    def __init__(self, input_directory, output_directory):
+    def __init__(self, input_directory, output_directory, packed=False):
         self._logger = logging.getLogger(self.__class__.__name__)
         self._input_dir = input_directory
         self._output_dir = output_directory
         self._fileset = FileSetReader()
-        self._output = UsageOutput(output_directory)
+        self._output = PackedUsageOutput(output_directory) if packed else UsageOutput(output_directory)
 
     def filter(self):
         self._fileset.initialize(self._input_dir)
@@ -133,10 +192,17 @@ class TaskUsageFilterer:
 
             line = self._fileset.next_line()
 
+        self._output.close()
+
 
 # main:
+if len(sys.argv) < 3:
+    print('Usage: python3 {} INPUT_DIRECTORY OUTPUT_DIRECTORY [--packed]\n'.format(sys.argv[0]))
+    exit()
+
 input_dir = sys.argv[1]
 output_dir = sys.argv[2]
+packed = len(sys.argv) > 3 and sys.argv[3] == '--packed'
 
-filterer = TaskUsageFilterer(input_dir, output_dir)
+filterer = TaskUsageFilterer(input_dir, output_dir, packed)
 filterer.filter()
@@ -0,0 +1,157 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+from math import floor
+
+class ResidualBuckets:
+    """ Servers grouped in buckets by quantized free resources (cpu_free,
+        mem_free). Best fit queries bound the score of each bucket and only
+        visit the buckets that can fit the demand and beat the best server
+        found so far. Ties are broken by the order in which servers were
+        appended, as a scan over them would. """
+    # bucket bounds are widened by this, so that rounding never excludes a server
+    MARGIN = 0.000000001
+
+    def __init__(self, servers, bucket_size):
+        self._bucket_size = bucket_size
+        self._buckets = {}
+        self._bucket_of = {}
+        self._order = {}
+        self._next_order = 0
+        for server in servers:
+            self.append(server)
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+    def __contains__(self, server):
+        return server in self._bucket_of
+
+    def append(self, server):
+        self._order[server] = self._next_order
+        self._next_order += 1
+        self._add_to_bucket(server)
+
+    def update(self, server):
+        if self._bucket_of[server] != self._bucket_key(server):
+            self._remove_from_bucket(server)
+            self._add_to_bucket(server)
+
+    def remove(self, server):
+        self._remove_from_bucket(server)
+        del self._order[server]
+
+    """ Server with cpu_free >= cpu and mem_free >= mem which minimizes
+        cpu_coef*cpu_free + mem_coef*mem_free (coefficients must not be
+        negative), or None. """
+    def smallest_feasible(self, cpu, mem, cpu_coef, mem_coef):
+        candidates = []
+        for key, servers in self._buckets.items():
+            cpu_low, cpu_high, mem_low, mem_high = self._bucket_bounds(key)
+            if cpu_high < cpu or mem_high < mem: continue
+            candidates.append((cpu_coef*max(cpu_low, cpu) + mem_coef*max(mem_low, mem), servers))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        best, best_size, best_order = None, None, None
+        for lower_bound, servers in candidates:
+            if best is not None and lower_bound > best_size: break
+            for server in servers:
+                if server.cpu_free >= cpu and server.mem_free >= mem:
+                    size = cpu_coef*server.cpu_free + mem_coef*server.mem_free
+                    if best is None or size < best_size or \
+                       (size == best_size and self._order[server] < best_order):
+                        best, best_size, best_order = server, size, self._order[server]
+        return best
+
+    """ The server whose remaining resources (cpu - cpu_alloc,
+        mem - mem_alloc) fit the demand and have the greatest dot product
+        with it (BestFit.dot_product), the first one on ties, or None. """
+    def greatest_dot_product(self, cpu, mem):
+        candidates = []
+        for key, servers in self._buckets.items():
+            cpu_low, cpu_high, mem_low, mem_high = self._bucket_bounds(key)
+            if cpu_high < cpu or mem_high < mem: continue
+            candidates.append((cpu_high*cpu + mem_high*mem, servers))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        best, best_product, best_order = None, None, None
+        for upper_bound, servers in candidates:
+            if best is not None and upper_bound < best_product: break
+            for server in servers:
+                cpu_remaining = server.cpu - server.cpu_alloc
+                mem_remaining = server.mem - server.mem_alloc
+                if cpu_remaining >= cpu and mem_remaining >= mem:
+                    product = cpu_remaining * cpu + mem_remaining * mem
+                    if best is None or product > best_product or \
+                       (product == best_product and self._order[server] < best_order):
+                        best, best_product, best_order = server, product, self._order[server]
+        return best
+
+    def _bucket_key(self, server):
+        return (floor(server.cpu_free / self._bucket_size),
+                floor(server.mem_free / self._bucket_size))
+
+    def _bucket_bounds(self, key):
+        return (key[0] * self._bucket_size - ResidualBuckets.MARGIN,
+                (key[0] + 1) * self._bucket_size + ResidualBuckets.MARGIN,
+                key[1] * self._bucket_size - ResidualBuckets.MARGIN,
+                (key[1] + 1) * self._bucket_size + ResidualBuckets.MARGIN)
+
+    def _add_to_bucket(self, server):
+        key = self._bucket_key(server)
+        self._bucket_of[server] = key
+        self._buckets.setdefault(key, set()).add(server)
+
+    def _remove_from_bucket(self, server):
+        key = self._bucket_of.pop(server)
+        self._buckets[key].discard(server)
+        if not self._buckets[key]: del self._buckets[key]
+
+
+class ServersBestFitIndex:
+    """ Residual buckets of the online and offline servers, which break ties
+        in the order of ResourceManager.online_servers() and
+        offline_servers(). It observes the ResourceManager to be kept up to
+        date. """
+
+    def __init__(self, online_servers, offline_servers, bucket_size):
+        self.online = ResidualBuckets(online_servers, bucket_size)
+        self.offline = ResidualBuckets(offline_servers, bucket_size)
+
+    def server_added(self, server):
+        self.offline.append(server)
+
+    def server_changed(self, server):
+        if server in self.online:
+            self.online.update(server)
+        else:
+            self.offline.update(server)
+
+    def server_turned_on(self, server):
+        self.offline.remove(server)
+        self.online.append(server)
+
+    def server_turned_off(self, server):
+        self.online.remove(server)
+        self.offline.append(server)
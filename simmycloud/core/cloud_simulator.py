@@ -56,6 +56,11 @@ class CloudSimulator:
         self._add_prediction_time(int(self._config.params['first_prediction_time']))
         self._add_vms_pool_verification_time(int(self._config.params['vms_pool_first_verification']))
         self._vms_pool_verification_interval = int(self._config.params['vms_pool_verification_interval'])
+        prediction_workers = int(self._config.params.get('prediction_workers', 0))
+        if prediction_workers > 0:
+            # imported here, as core.config imports this module
+            from core.parallel_prediction import ParallelPrediction
+            self._config.parallel_prediction = ParallelPrediction(self._config, prediction_workers)
         self._add_simulation_started_event()
 
     def _process_events(self, events):
@@ -90,9 +95,6 @@ class CloudSimulator:
                     self._config.resource_manager.free_vm_resources(event.vm)
                     self._config.statistics.notify_event('vm_finished',
                                                          vm= event.vm)
-                    # this should be removed. A global observer/notifier can be used
-                    if 'MeasurementReader' in self._config.module:
-                        self._config.module['MeasurementReader'].free_cache_for_vm(event.vm.name)
                 else:
                     self._config.statistics.notify_event('outdated_finish_events')
             self._verify_machines_to_turn_off(set(updated_servers))
@@ -113,15 +115,21 @@ class CloudSimulator:
         strategies = self._config.strategies
 
         if event.type == EventType.TIME_TO_PREDICT:
-            for server in self._config.resource_manager.online_servers():
-                for vm in server.vm_list():
-                    prediction = strategies.prediction.predict(vm.name)
-                    if prediction is not None:
-                        self._config.events_queue.add_event(
-                            EventBuilder.build_update_event(self._config.simulation_info.current_timestamp,
-                                                            vm.name,
-                                                            prediction[0],
-                                                            prediction[1]))
+            update_events = []
+            vm_names = [vm.name for server in self._config.resource_manager.online_servers()
+                                for vm in server.vm_list()]
+            if self._config.parallel_prediction is not None:
+                predictions = self._config.parallel_prediction.predict_many(vm_names)
+            else:
+                predictions = strategies.prediction.predict_many(vm_names)
+            for vm_name, prediction in zip(vm_names, predictions):
+                if prediction is not None:
+                    update_events.append(
+                        EventBuilder.build_update_event(self._config.simulation_info.current_timestamp,
+                                                        vm_name,
+                                                        prediction[0],
+                                                        prediction[1]))
+            self._config.events_queue.add_events(update_events)
             self._add_prediction_time(
                 self._config.simulation_info.current_timestamp + strategies.prediction.next_prediction_interval())
 
@@ -47,6 +47,8 @@ class Config:
         self.simulation_info = SimulationInfo()
         self.params = dict()
         self.module = dict()
+        # set by CloudSimulator when predictions run in worker processes
+        self.parallel_prediction = None
 
     def initialize(self):
         logger = logging.getLogger(self.identifier)
@@ -127,6 +129,8 @@ class ConfigBuilder:
             config.strategies.migration = cls._get_object(section['migration_strategy'])
             config.strategies.powering_off = cls._get_object(section['powering_off_strategy'])
             config.resource_manager = ResourceManager(cls._get_object(section['environment_builder']))
+            if section.get('events_queue'):
+                config.events_queue = cls._get_object(section['events_queue'])
             # statistics
             config.statistics = StatisticsManager()
             statistics_modules = [value.strip() for value in section['statistics_modules'].split(',') if value.strip()]
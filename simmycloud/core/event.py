@@ -27,7 +27,11 @@ import os
 import fileinput
 import re
 import heapq
-from collections import defaultdict, deque
+import itertools
+import mmap
+import struct
+import sys
+from collections import deque
 
 from core.virtual_machine import VirtualMachine
 
@@ -56,18 +60,23 @@ class EventType:
 
 
 class Event:
+    # the events queue may hold millions of events, so no __dict__ per event
+    __slots__ = ('type', 'time', 'process_time', 'vm', 'message', 'cancelled')
 
     def __init__(self, event_type, time=0, vm_name='', cpu=0.0, mem=0.0, process_time=0, message=''):
         self.type = event_type
         self.time = time
         self.process_time = process_time
-        self.vm = VirtualMachine(vm_name, cpu, mem)
+        # NOTIFY, UPDATES_FINISHED, VERIFY_VMS_POOL and TIME_TO_PREDICT events have no VM
+        self.vm = VirtualMachine(vm_name, cpu, mem) if vm_name else None
         self.message = message
+        # cancelled events stay in the events queue until they are discarded
+        self.cancelled = False
 
     def dump(self):
         return '{}, {}, [[{}], {} | {}]'.format(EventType.get_type(self.type),
                                                 self.time,
-                                                self.vm.dump(),
+                                                self.vm.dump() if self.vm is not None else '',
                                                 self.process_time,
                                                 self.message
                                                 )
@@ -90,6 +99,16 @@ class EventBuilder:
                      process_time=int(data[4] if data[4] else 0)
             )
 
+    @staticmethod
+    def build_submit_event_from_values(timestamp, vm_name, cpu, mem, process_time):
+        return Event(EventType.SUBMIT,
+                     time=timestamp,
+                     vm_name=vm_name,
+                     cpu=cpu,
+                     mem=mem,
+                     process_time=process_time
+            )
+
     @staticmethod
     def build_update_event(timestamp, vm_name, cpu, mem):
         return Event(EventType.UPDATE,
@@ -138,16 +157,26 @@ class SubmitEventsQueue:
         self._clear()
 
     def _clear(self):
-        self._fileset = FileSetReader()
+        self._fileset = None
+        self._binary_reader = None
         self._event = None
         self._loggger = None
 
     def set_config(self, config):
         self._config = config
-        self._fileset.set_config(config)
 
     def initialize(self):
-        self._fileset.initialize()
+        input_format = self._config.params.get('input_format', 'csv')
+        if input_format == 'csv':
+            self._fileset = self._build_fileset_reader()
+            self._fileset.set_config(self._config)
+            self._fileset.initialize()
+        elif input_format == 'binary':
+            self._binary_reader = BinarySubmitsReader()
+            self._binary_reader.set_config(self._config)
+            self._binary_reader.initialize()
+        else:
+            raise Exception('Set input_format param with one of these values: csv or binary.')
         self._logger = self._config.getLogger(self)
         self._max_submit_timestamp = self._config.params.get('max_submit_timestamp')
         self._max_finish_timestamp = self._config.params.get('max_finish_timestamp')
@@ -157,8 +186,11 @@ class SubmitEventsQueue:
             self._max_finish_timestamp = int(self._max_finish_timestamp)
 
     def next_event(self):
-        self._line =  self._fileset.next_line()
-        event = EventBuilder.build_submit_event(self._line)
+        if self._binary_reader is not None:
+            event = self._binary_reader.next_event()
+        else:
+            self._line =  self._fileset.next_line()
+            event = EventBuilder.build_submit_event(self._line)
         if self._max_submit_timestamp and event and event.time > self._max_submit_timestamp:
             self._logger.info('Max submit timestamp reached (%d). Ignoring upcoming submits.', self._max_submit_timestamp)
             self._logger.debug('First event ignored: %s', event.dump())
@@ -172,7 +204,17 @@ class SubmitEventsQueue:
         return self._event
 
     def current_line(self):
-        return self._fileset.current_line()
+        return self._fileset.current_line() if self._fileset is not None else None
+
+    def _build_fileset_reader(self):
+        reader = self._config.params.get('input_reader', 'whole_file')
+        if reader == 'whole_file':
+            return FileSetReader()
+        elif reader == 'streaming':
+            return StreamingFileSetReader(int(self._config.params.get('input_read_ahead_lines',
+                                                                      StreamingFileSetReader.DEFAULT_READ_AHEAD)))
+        else:
+            raise Exception('Set input_reader param with one of these values: whole_file or streaming.')
 
 
 class FileSetReader:
@@ -230,7 +272,172 @@ class FileSetReader:
             line = opened_file.readline()
 
 
+class StreamingFileSetReader(FileSetReader):
+    """ Reads the input files lazily. At most read_ahead lines are kept in
+        memory, so the memory footprint doesn't depend on the files' sizes. """
+    DEFAULT_READ_AHEAD = 1000
+
+    def __init__(self, read_ahead=DEFAULT_READ_AHEAD):
+        self._read_ahead = max(read_ahead, 1)
+        super().__init__()
+
+    def _clear(self):
+        super()._clear()
+        self._opened_file = None
+        self._filename = None
+
+    def next_line(self):
+        if len(self._lines) == 0:
+            self._read_ahead_lines()
+        self._line = self._lines.popleft() if len(self._lines) > 0 else None
+        return self._line
+
+    def _read_ahead_lines(self):
+        while len(self._lines) == 0 and self._opened_file is not None:
+            line = self._opened_file.readline()
+            while len(line) > 0:
+                self._lines.append(line)
+                if len(self._lines) == self._read_ahead: break
+                line = self._opened_file.readline()
+
+            if len(self._lines) == 0:
+                self._close_current_file()
+                self._load_next_file()
+
+    def _load_next_file(self):
+        if len(self._files) > 0:
+            self._filename = self._files.popleft()
+            self._logger.info('Opening file: %s', self._filename)
+            self._opened_file = open(self._filename)
+
+        else:
+            self._logger.info('No more files to open.')
+
+    def _close_current_file(self):
+        self._logger.info('Closing file: %s', self._filename)
+        self._opened_file.close()
+        self._opened_file = None
+        self._filename = None
+
+
+class BinarySubmitsFormat:
+    """ Binary columnar submits trace, read by BinarySubmitsReader and
+        written by scripts/convert_submits_to_binary.py.
+
+        header: magic, version, byte order, events, vm names, vm names blob size
+        columns (each one padded to ALIGNMENT bytes), with these typecodes:
+          timestamp     TIMESTAMP[events]
+          process_time  PROCESS_TIME[events]
+          cpu           CPU[events]
+          mem           MEM[events]
+          vm_id         VM_ID[events]
+          name_offsets  NAME_OFFSET[vm names + 1]
+          names         utf-8 blob """
+    MAGIC = b'SMCSUBMT'
+    VERSION = 1
+    LITTLE_ENDIAN = 1
+    BIG_ENDIAN = 2
+    HEADER = struct.Struct('=8sIIQQQ')
+    ALIGNMENT = 8
+
+    TIMESTAMP = 'q'
+    PROCESS_TIME = 'q'
+    CPU = 'd'
+    MEM = 'd'
+    VM_ID = 'I'
+    NAME_OFFSET = 'Q'
+
+    @classmethod
+    def native_byte_order(cls):
+        return cls.LITTLE_ENDIAN if sys.byteorder == 'little' else cls.BIG_ENDIAN
+
+
+class BinarySubmitsReader:
+    """ Reads submit events from a binary columnar trace (see
+        BinarySubmitsFormat), created with
+        scripts/convert_submits_to_binary.py. The file is memory-mapped and
+        its columns are read in place, so no line is parsed. """
+
+    def __init__(self):
+        self._clear()
+
+    def _clear(self):
+        self._file = None
+        self._mmap = None
+        self._columns = []
+        self._events = 0
+        self._position = 0
+        self._logger = None
+
+    def set_config(self, config):
+        self._config = config
+
+    def initialize(self):
+        self._clear()
+        self._logger = self._config.getLogger(self)
+        filename = self._config.params['input_binary_file']
+        self._logger.info('Opening file: %s', filename)
+        self._file = open(filename, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_columns(filename)
+
+    def next_event(self):
+        if self._position >= self._events:
+            if self._mmap is not None:
+                self._close()
+            return None
+
+        i = self._position
+        self._position += 1
+        return EventBuilder.build_submit_event_from_values(self._timestamps[i],
+                                                           self._vm_name(self._vm_ids[i]),
+                                                           self._cpus[i],
+                                                           self._mems[i],
+                                                           self._process_times[i])
+
+    def _vm_name(self, vm_id):
+        return str(self._names[self._name_offsets[vm_id]:self._name_offsets[vm_id+1]], 'utf-8')
+
+    def _map_columns(self, filename):
+        layout = BinarySubmitsFormat
+        magic, version, byte_order, events, vm_names, names_size = layout.HEADER.unpack_from(self._mmap, 0)
+        if magic != layout.MAGIC or version != layout.VERSION:
+            raise Exception('{} is not a binary submits trace (version {}).'.format(filename, layout.VERSION))
+        if byte_order != layout.native_byte_order():
+            raise Exception('{} was created on a machine with a different byte order.'.format(filename))
+
+        self._events = events
+        offset = layout.HEADER.size
+        self._timestamps, offset = self._column(offset, layout.TIMESTAMP, events)
+        self._process_times, offset = self._column(offset, layout.PROCESS_TIME, events)
+        self._cpus, offset = self._column(offset, layout.CPU, events)
+        self._mems, offset = self._column(offset, layout.MEM, events)
+        self._vm_ids, offset = self._column(offset, layout.VM_ID, events)
+        self._name_offsets, offset = self._column(offset, layout.NAME_OFFSET, vm_names + 1)
+        self._names, offset = self._column(offset, 'B', names_size)
+        self._logger.info('%d submit events found in %s', events, filename)
+
+    def _column(self, offset, typecode, length):
+        offset += -offset % BinarySubmitsFormat.ALIGNMENT
+        size = struct.calcsize(typecode) * length
+        column = memoryview(self._mmap)[offset:offset + size].cast(typecode)
+        self._columns.append(column)
+        return column, offset + size
+
+    def _close(self):
+        self._logger.info('Closing file: %s', self._file.name)
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+        self._file = None
+
+
 class EventsQueue:
+    DEFAULT_COMPACTION_RATIO = 0.5
+
     def __init__(self):
         self._clear()
 
@@ -239,8 +446,11 @@ class EventsQueue:
         self._config = None
         self._heap = list()
         self._submit_events = SubmitEventsQueue()
-        self._counters = defaultdict(lambda: 0)
+        self._sequence = itertools.count()
         self._last_timestamp = -1
+        self._events_in_timestamp = 0
+        self._cancelled_events = 0
+        self._compaction_ratio = EventsQueue.DEFAULT_COMPACTION_RATIO
 
     # TODO: too much dependent of simulation rules to be hard coded
     _PRIORITY = [EventType.NOTIFY,
@@ -252,8 +462,7 @@ class EventsQueue:
                     EventType.SUBMIT,
                     EventType.UNKNOWN
                     ]
-    def _get_priority(self, event_type):
-        return EventsQueue._PRIORITY.index(event_type)
+    _PRIORITY_OF_TYPE = {event_type: priority for priority, event_type in enumerate(_PRIORITY)}
 
     def _add_new_submit_event(self):
         new_event = self._submit_events.next_event()
@@ -269,41 +478,186 @@ class EventsQueue:
     def initialize(self):
         self._submit_events.initialize()
         self._logger = self._config.getLogger(self)
+        self._compaction_ratio = float(self._config.params.get('events_queue_compaction_ratio',
+                                                               EventsQueue.DEFAULT_COMPACTION_RATIO))
         self._has_submit_events = True
         self._add_new_submit_event()
 
     def clear(self):
         self._heap = list()
+        self._cancelled_events = 0
 
     def has_submit_events(self):
         return self._has_submit_events
 
+    # heap entries: (time, priority, sequence, event). The sequence number
+    # keeps the insertion order among events of the same time and type.
     def add_event(self, event):
         heapq.heappush(self._heap, (event.time,
-                                    self._get_priority(event.type),
-                                    self._counters[event.time],
+                                    self._PRIORITY_OF_TYPE[event.type],
+                                    next(self._sequence),
                                     event
                                     ))
-        self._counters[event.time] = self._counters[event.time] + 1
+
+    def add_events(self, events):
+        priority_of_type = self._PRIORITY_OF_TYPE
+        entries = [(event.time, priority_of_type[event.type], next(self._sequence), event)
+                   for event in events]
+
+        # k pushes cost O(k log n) while a heapify costs O(n + k)
+        if len(entries) * (len(self._heap) + 1).bit_length() > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+
+    """ Cancels an event that is still in the queue. It is discarded when
+        it reaches the head of the queue, or earlier, when the cancelled
+        events exceed the compaction ratio of the queue. """
+    def cancel_event(self, event):
+        if event.cancelled: return
+        event.cancelled = True
+        self._cancelled_events += 1
+        if self._cancelled_events > self._compaction_ratio * self._pending_events():
+            self._compact()
 
     def next_events(self):
-        if len(self._heap) == 0:
+        event = None
+        while len(self._heap) > 0 and event is None:
+            time, priority, _, event = heapq.heappop(self._heap)
+            if event.cancelled:
+                self._cancelled_events -= 1
+                event = None
+        if event is None:
             return None
 
-        events = [heapq.heappop(self._heap)[-1]]
-        if events[0].type == EventType.SUBMIT: self._add_new_submit_event()
+        events = [event]
+        if event.type == EventType.SUBMIT: self._add_new_submit_event()
 
         while len(self._heap) > 0 and\
-              self._heap[0][-1].time == events[0].time and\
-              self._heap[0][-1].type == events[0].type:
-            events.append(heapq.heappop(self._heap)[-1])
-            if events[-1].type == EventType.SUBMIT: self._add_new_submit_event()
+              self._heap[0][0] == time and\
+              self._heap[0][1] == priority:
+            event = heapq.heappop(self._heap)[-1]
+            if event.cancelled:
+                self._cancelled_events -= 1
+                continue
+            events.append(event)
+            if event.type == EventType.SUBMIT: self._add_new_submit_event()
+
+        self._count_events(time, events)
+        return events
+
+    def _pending_events(self):
+        return len(self._heap)
+
+    def _compact(self):
+        self._logger.debug('Compacting events queue: %d of %d events are cancelled.',
+                           self._cancelled_events, self._pending_events())
+        self._heap = [entry for entry in self._heap if not entry[-1].cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled_events = 0
 
-        if events[0].time > self._last_timestamp:
+    def _count_events(self, time, events):
+        if time > self._last_timestamp:
             self._logger.debug('Timestamp %d is over, had %d events.',
                                self._last_timestamp,
-                               self._counters[self._last_timestamp])
-            del self._counters[self._last_timestamp]
-            self._last_timestamp = events[0].time
+                               self._events_in_timestamp)
+            self._last_timestamp = time
+            self._events_in_timestamp = 0
+        self._events_in_timestamp += len(events)
 
-        return events
+
+class CalendarEventsQueue(EventsQueue):
+    """ Events queue for traces with integer timestamps. Events are kept in
+        buckets keyed by timestamp, each bucket holding one list of events per
+        priority. Adding and removing an event is O(1) amortized; only the
+        timestamps of the buckets are kept in a heap. """
+
+    def _clear(self):
+        super()._clear()
+        self._buckets = dict()
+        self._timestamps = list()
+        self._events = 0
+
+    def clear(self):
+        self._buckets = dict()
+        self._timestamps = list()
+        self._events = 0
+        self._cancelled_events = 0
+
+    def add_event(self, event):
+        bucket = self._buckets.get(event.time)
+        if bucket is None:
+            bucket = self._new_bucket(event.time)
+        priority = self._PRIORITY_OF_TYPE[event.type]
+        if bucket[priority] is None:
+            bucket[priority] = [event]
+        else:
+            bucket[priority].append(event)
+        self._events += 1
+
+    def add_events(self, events):
+        for event in events:
+            self.add_event(event)
+
+    def next_events(self):
+        while len(self._timestamps) > 0:
+            time = self._timestamps[0]
+            bucket = self._buckets[time]
+            priority = self._first_priority(bucket)
+            if priority is None:
+                heapq.heappop(self._timestamps)
+                del self._buckets[time]
+                continue
+
+            events = bucket[priority]
+            bucket[priority] = None
+            self._events -= len(events)
+            if self._cancelled_events > 0:
+                live_events = [event for event in events if not event.cancelled]
+                self._cancelled_events -= len(events) - len(live_events)
+                if len(live_events) == 0: continue
+                events = live_events
+
+            if events[0].type == EventType.SUBMIT:
+                # new submit events with the same timestamp join this batch
+                i = 0
+                while i < len(events):
+                    self._add_new_submit_event()
+                    i += 1
+                    if bucket[priority] is not None:
+                        events.extend(bucket[priority])
+                        self._events -= len(bucket[priority])
+                        bucket[priority] = None
+
+            self._count_events(time, events)
+            return events
+
+        return None
+
+    def _pending_events(self):
+        return self._events
+
+    def _compact(self):
+        self._logger.debug('Compacting events queue: %d of %d events are cancelled.',
+                           self._cancelled_events, self._pending_events())
+        for bucket in self._buckets.values():
+            for priority, events in enumerate(bucket):
+                if events is not None:
+                    live_events = [event for event in events if not event.cancelled]
+                    bucket[priority] = live_events if len(live_events) > 0 else None
+        self._events -= self._cancelled_events
+        self._cancelled_events = 0
+
+    def _new_bucket(self, time):
+        bucket = [None] * len(self._PRIORITY)
+        self._buckets[time] = bucket
+        heapq.heappush(self._timestamps, time)
+        return bucket
+
+    def _first_priority(self, bucket):
+        for priority, events in enumerate(bucket):
+            if events is not None:
+                return priority
+        return None
@@ -0,0 +1,131 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+class FirstFitTree:
+    """ Max segment tree over the free resources (cpu_free, mem_free) of
+        items kept in a fixed order. first_fit finds the first item in
+        which a demand fits without scanning all of them.
+        Removed items leave a hole, so that the order of the others is
+        kept. Holes are compacted once they outnumber the items. """
+    EMPTY = float('-inf')
+    MIN_HOLES = 64
+
+    def __init__(self, items=()):
+        self._rebuild(list(items))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def append(self, item):
+        if len(self._items) == self._capacity:
+            self._rebuild(self._live_items() + [item])
+            return
+        position = len(self._items)
+        self._items.append(item)
+        self._positions[item] = position
+        self._set_leaf(position, item.cpu_free, item.mem_free)
+
+    def update(self, item):
+        self._set_leaf(self._positions[item], item.cpu_free, item.mem_free)
+
+    def remove(self, item):
+        position = self._positions.pop(item)
+        self._items[position] = None
+        self._set_leaf(position, FirstFitTree.EMPTY, FirstFitTree.EMPTY)
+        if len(self._items) - len(self._positions) > max(len(self._positions), FirstFitTree.MIN_HOLES):
+            self._rebuild(self._live_items())
+
+    """ Returns the first item with cpu_free >= cpu and mem_free >= mem,
+        or None. """
+    def first_fit(self, cpu, mem):
+        cpu_max, mem_max = self._cpu_max, self._mem_max
+        nodes = [1]
+        while nodes:
+            node = nodes.pop()
+            if cpu_max[node] < cpu or mem_max[node] < mem:
+                continue
+            if node >= self._capacity:
+                return self._items[node - self._capacity]
+            # left child is visited first
+            nodes.append(2*node + 1)
+            nodes.append(2*node)
+        return None
+
+    def _live_items(self):
+        return [item for item in self._items if item is not None]
+
+    def _rebuild(self, items):
+        self._capacity = 1
+        while self._capacity < len(items):
+            self._capacity *= 2
+        self._items = items
+        self._positions = {item: position for position, item in enumerate(items)}
+        self._cpu_max = [FirstFitTree.EMPTY] * (2 * self._capacity)
+        self._mem_max = [FirstFitTree.EMPTY] * (2 * self._capacity)
+        for position, item in enumerate(items):
+            self._cpu_max[self._capacity + position] = item.cpu_free
+            self._mem_max[self._capacity + position] = item.mem_free
+        for node in reversed(range(1, self._capacity)):
+            self._cpu_max[node] = max(self._cpu_max[2*node], self._cpu_max[2*node + 1])
+            self._mem_max[node] = max(self._mem_max[2*node], self._mem_max[2*node + 1])
+
+    def _set_leaf(self, position, cpu, mem):
+        node = self._capacity + position
+        self._cpu_max[node] = cpu
+        self._mem_max[node] = mem
+        node //= 2
+        while node > 0:
+            self._cpu_max[node] = max(self._cpu_max[2*node], self._cpu_max[2*node + 1])
+            self._mem_max[node] = max(self._mem_max[2*node], self._mem_max[2*node + 1])
+            node //= 2
+
+
+class ServersFirstFitIndex:
+    """ First fit trees of the online and offline servers, in the order of
+        ResourceManager.online_servers() and offline_servers(). It observes
+        the ResourceManager to be kept up to date. """
+
+    def __init__(self, online_servers, offline_servers):
+        self.online = FirstFitTree(online_servers)
+        self.offline = FirstFitTree(offline_servers)
+
+    def server_added(self, server):
+        self.offline.append(server)
+
+    def server_changed(self, server):
+        if server in self.online:
+            self.online.update(server)
+        else:
+            self.offline.update(server)
+
+    def server_turned_on(self, server):
+        self.offline.remove(server)
+        self.online.append(server)
+
+    def server_turned_off(self, server):
+        self.online.remove(server)
+        self.offline.append(server)
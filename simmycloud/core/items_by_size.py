@@ -0,0 +1,62 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+from core.first_fit_tree import FirstFitTree
+
+
+class ItemsBySize:
+    """ Items sorted by decreasing size, ties kept in the items' order.
+        biggest_feasible finds the biggest item that fits in a bin without
+        scanning all of them: a FirstFitTree is kept over the negated
+        demands, so that "the first item with -cpu >= -cpu_free and
+        -mem >= -mem_free" is the biggest feasible one. Removing an item
+        takes O(log n). """
+
+    def __init__(self, items, size_of_item):
+        demands = sorted((_NegatedDemand(item) for item in items),
+                         key=lambda demand: -size_of_item(demand.item))
+        self._demands = {demand.item: demand for demand in demands}
+        self._tree = FirstFitTree(demands)
+
+    def __len__(self):
+        return len(self._demands)
+
+    def __contains__(self, item):
+        return item in self._demands
+
+    def biggest_feasible(self, bin):
+        demand = self._tree.first_fit(-bin.cpu_free, -bin.mem_free)
+        return demand.item if demand is not None else None
+
+    def remove(self, item):
+        self._tree.remove(self._demands.pop(item))
+
+
+class _NegatedDemand:
+    __slots__ = ('item', 'cpu_free', 'mem_free')
+
+    def __init__(self, item):
+        self.item = item
+        self.cpu_free = -item.cpu
+        self.mem_free = -item.mem
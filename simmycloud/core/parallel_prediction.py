@@ -0,0 +1,181 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+
+from multiprocessing import Pool
+from zlib import crc32
+
+from core.config import Config, ConfigBuilder
+from core.statistics_manager import StatisticsManager
+
+class ParallelPrediction:
+    """ Predicts the demands of VMs in worker processes, for the simulator's
+        prediction ticks and for PredictionErrorStatistics. Each VM name is
+        always sent to the same worker, so that its measurements stay in that
+        worker's MeasurementReader cache (and its predictions in the
+        strategy's memo). A worker builds its own prediction strategy and
+        modules from the config params and predicts its shard with the
+        strategy's predict_many. """
+
+    def __init__(self, config, workers):
+        self._config = config
+        self._logger = config.getLogger(self)
+        self._pools = [Pool(processes=1,
+                            initializer=_initialize_worker,
+                            initargs=('{}.prediction_worker_{}'.format(config.identifier, worker),
+                                      config.logging_level,
+                                      config.params))
+                       for worker in range(workers)]
+        self._finished_vms = [[] for pool in self._pools]
+        config.statistics.add_listener('vm_finished', self)
+        config.statistics.add_listener('simulation_finished', self)
+
+    """ Same as PredictionStrategy.predict_many: returns a list with the
+        predicted demands (or None) of each VM name in vm_names. """
+    def predict_many(self, vm_names):
+        shards = [[] for pool in self._pools]
+        for vm_name in vm_names:
+            shards[self._worker_of(vm_name)].append(
+                self._config.resource_manager.get_vm_allocation_data(vm_name))
+
+        results = []
+        for worker, shard in enumerate(shards):
+            if not shard and not self._finished_vms[worker]:
+                continue
+            results.append(self._pools[worker].apply_async(
+                _predict, (self._config.simulation_info.current_timestamp,
+                           shard,
+                           self._finished_vms[worker])))
+            self._finished_vms[worker] = []
+
+        new_demands = dict()
+        for result in results:
+            worker_predictions, worker_counters = result.get()
+            for vm_name, cpu, mem in worker_predictions:
+                new_demands[vm_name] = (cpu, mem)
+            for event, how_many in worker_counters.items():
+                self._config.statistics.notify_event(event, how_many)
+
+        # in vm_names order, whatever the order the workers finished
+        predictions = []
+        for vm_name in vm_names:
+            prediction = new_demands.get(vm_name)
+            if prediction is not None:
+                self._logger.debug('Predicted demands for VM %s: %f, %f',
+                                   vm_name, prediction[0], prediction[1])
+                self._config.statistics.notify_event('new_demands')
+            predictions.append(prediction)
+        return predictions
+
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'vm_finished':
+            vm = kwargs['vm']
+            self._finished_vms[self._worker_of(vm.name)].append(vm)
+        elif event == 'simulation_finished':
+            self.shutdown()
+
+    def shutdown(self):
+        for pool in self._pools:
+            pool.apply(_finish)
+            pool.close()
+            pool.join()
+        self._pools = []
+
+    def _worker_of(self, vm_name):
+        return crc32(vm_name.encode()) % len(self._pools)
+
+
+class _AllocationDataOfShard:
+    """ Stands for the ResourceManager in a worker: it serves the allocation
+        data (read by MeasurementReader) of the VMs sent to the worker. """
+
+    def __init__(self):
+        self._allocation_data = dict()
+
+    def set_allocation_data(self, allocation_data):
+        self._allocation_data = {data.vm.name: data for data in allocation_data}
+
+    def get_vm_allocation_data(self, vm_name):
+        return self._allocation_data.get(vm_name)
+
+
+class _WorkerCounters:
+    """ Counts the counter events notified in a worker, to be notified in
+        the simulator's process. """
+    EVENTS = ['prediction_memo_hits', 'prediction_memo_misses']
+
+    def __init__(self):
+        self.counters = dict()
+
+    def notify_event(self, event, how_many=1):
+        self.counters[event] = self.counters.get(event, 0) + how_many
+
+
+_worker_config = None
+_worker_counters = None
+
+def _initialize_worker(identifier, logging_level, params):
+    global _worker_config, _worker_counters
+    config = Config()
+    config.identifier = identifier
+    config.logging_level = logging_level
+    config.params = params
+    config.resource_manager = _AllocationDataOfShard()
+    config.statistics = StatisticsManager()
+    config.strategies.prediction = ConfigBuilder._get_object(params['prediction_strategy'])
+    modules = [value.strip() for value in params['modules'].split(',') if value.strip()]
+    for module in modules:
+        config.module[module.split('.')[-1]] = ConfigBuilder._get_object(module)
+
+    config.statistics.set_config(config)
+    config.statistics.initialize()
+    _worker_counters = _WorkerCounters()
+    for event in _WorkerCounters.EVENTS:
+        config.statistics.add_listener(event, _worker_counters)
+    config.strategies.prediction.set_config(config)
+    config.strategies.prediction.initialize()
+    for module in config.module.values():
+        module.set_config(config)
+        module.initialize()
+    _worker_config = config
+
+def _predict(timestamp, allocation_data, finished_vms):
+    config = _worker_config
+    for vm in finished_vms:
+        config.statistics.notify_event('vm_finished', vm=vm)
+
+    config.simulation_info.current_timestamp = timestamp
+    config.resource_manager.set_allocation_data(allocation_data)
+    vm_names = [data.vm.name for data in allocation_data]
+    predictions = config.strategies.prediction.predict_many(vm_names)
+    counters = _worker_counters.counters
+    _worker_counters.counters = dict()
+    return ([(vm_name, prediction[0], prediction[1])
+             for vm_name, prediction in zip(vm_names, predictions)
+             if prediction is not None],
+            counters)
+
+def _finish():
+    _worker_config.statistics.notify_event('simulation_finished',
+                                           timestamp=_worker_config.simulation_info.current_timestamp)
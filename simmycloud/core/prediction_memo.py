@@ -0,0 +1,80 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+
+from collections import OrderedDict
+
+class PredictionMemo:
+    """ Remembers the last prediction of each VM with the window of measured
+        values it was made of, so that predicting an unchanged window (an
+        idle VM, or the same tick predicted twice) costs a dict lookup.
+        Predictions must depend only on the window. At most
+        'prediction_memo_size' VMs are remembered (0 disables the memo), the
+        least recently used are forgotten first, and finished VMs are
+        forgotten. Hits and misses are notified to the StatisticsManager as
+        'prediction_memo_hits' and 'prediction_memo_misses'. """
+
+    MISS = object()
+
+    def __init__(self, config):
+        self._config = config
+        self._max_size = int(config.params.get('prediction_memo_size', 10000))
+        self._predictions = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        config.statistics.add_listener('vm_finished', self)
+
+    """ Returns the prediction made for vm_name with this window, or
+        PredictionMemo.MISS. """
+    def lookup(self, vm_name, window):
+        if self._max_size <= 0:
+            return PredictionMemo.MISS
+        entry = self._predictions.get(vm_name)
+        if entry is not None and entry[0] == window:
+            self._predictions.move_to_end(vm_name)
+            self._hits += 1
+            return entry[1]
+        self._misses += 1
+        return PredictionMemo.MISS
+
+    def store(self, vm_name, window, prediction):
+        if self._max_size <= 0:
+            return
+        self._predictions[vm_name] = (window, prediction)
+        self._predictions.move_to_end(vm_name)
+        if len(self._predictions) > self._max_size:
+            self._predictions.popitem(last=False)
+
+    """ Notifies the hits and misses counted since the last call. """
+    def notify_statistics(self):
+        if self._hits > 0:
+            self._config.statistics.notify_event('prediction_memo_hits', self._hits)
+        if self._misses > 0:
+            self._config.statistics.notify_event('prediction_memo_misses', self._misses)
+        self._hits = 0
+        self._misses = 0
+
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'vm_finished':
+            self._predictions.pop(kwargs['vm'].name, None)
@@ -24,6 +24,8 @@
 
 from core.server import Server
 from core.event import EventBuilder
+from core.first_fit_tree import ServersFirstFitIndex
+from core.best_fit_index import ServersBestFitIndex
 
 class ResourceManager:
 
@@ -31,22 +33,44 @@ class ResourceManager:
         self._builder = environment_builder
         self._online_servers = {}
         self._offline_servers = {}
+        # all servers, by index
+        self._servers = []
+        self._observers = []
+        self._capacity_table = None
+        self._first_fit_index = None
+        self._best_fit_index = None
+        # servers whose allocated resources changed since the last
+        # consume_dirty_servers call, and the order they were turned on
+        self._dirty_servers = {}
+        self._online_order = {}
+        self._turned_on_servers = 0
         self._vm_hosts = {}
         self._vm_status = {}
         self._logger = None
         self._config = None
 
     def _add_finish_event(self, vm):
-        finish_at = self._current_timestamp() + self._vm_status[vm.name].remaining_time
-        self._vm_status[vm.name].last_finish_time = finish_at
-        self._config.events_queue.add_event(
-                EventBuilder.build_finish_event(finish_at,
-                                                vm.name))
+        vm_status = self._vm_status[vm.name]
+        self._cancel_finish_event(vm_status)
+        finish_at = self._current_timestamp() + vm_status.remaining_time
+        vm_status.last_finish_time = finish_at
+        vm_status.finish_event = EventBuilder.build_finish_event(finish_at,
+                                                                 vm.name)
+        self._config.events_queue.add_event(vm_status.finish_event)
 
     def _update_vm_status_freeing_resources(self, vm):
         vm_status = self._vm_status[vm.name]
         vm_status.remaining_time = vm_status.last_finish_time - self._current_timestamp()
         vm_status.last_finish_time = None
+        self._cancel_finish_event(vm_status)
+
+    def _cancel_finish_event(self, vm_status):
+        # a FINISH event at the current timestamp may have already been processed
+        if vm_status.finish_event is not None and \
+           vm_status.finish_event.time > self._current_timestamp():
+            self._config.events_queue.cancel_event(vm_status.finish_event)
+            self._config.statistics.notify_event('outdated_finish_events')
+        vm_status.finish_event = None
 
     def _current_timestamp(self):
         return self._config.simulation_info.current_timestamp
@@ -63,10 +87,17 @@ class ResourceManager:
         self._logger.debug('Adding {} server(s) of type {}'.format(quantity, server.describe()))
         servers_count = len(self._online_servers) + len(self._offline_servers) + 1
         while quantity > 0:
-            self._offline_servers[str(servers_count)] = Server(str(servers_count),
-                                                               server.cpu,
-                                                               server.mem
-                                                               )
+            new_server = Server(str(servers_count),
+                                server.cpu,
+                                server.mem
+                                )
+            new_server.index = len(self._servers)
+            self._servers.append(new_server)
+            self._offline_servers[new_server.name] = new_server
+            if self._observers:
+                new_server.observer = self
+                for observer in self._observers:
+                    observer.server_added(new_server)
             quantity -= 1
             servers_count += 1
 
@@ -75,6 +106,10 @@ class ResourceManager:
         self._logger.debug('Server {} being turned on'.format(server_name))
         server = self._offline_servers.pop(server_name)
         self._online_servers[server_name] = server
+        self._turned_on_servers += 1
+        self._online_order[server_name] = self._turned_on_servers
+        for observer in self._observers:
+            observer.server_turned_on(server)
         return server
 
     def turn_off_server(self, server_name):
@@ -82,12 +117,62 @@ class ResourceManager:
         self._logger.debug('Server {} being turned off'.format(server_name))
         server = self._online_servers.pop(server_name)
         self._offline_servers[server_name] = server
+        del self._online_order[server_name]
+        self._dirty_servers.pop(server_name, None)
+        for observer in self._observers:
+            observer.server_turned_off(server)
+
+    """ An observer is notified with server_added, server_changed (allocated
+        resources changed), server_turned_on and server_turned_off, all of
+        them receiving the server. """
+    def add_observer(self, observer):
+        if not self._observers:
+            for server in self._servers:
+                server.observer = self
+        self._observers.append(observer)
+
+    def server_changed(self, server):
+        for observer in self._observers:
+            observer.server_changed(server)
+
+    """ Resources of all servers in NumPy arrays, indexed by server index.
+        It is created on the first call and kept up to date afterwards. """
+    def capacity_table(self):
+        if self._capacity_table is None:
+            from core.servers_capacity_table import ServersCapacityTable
+            self._capacity_table = ServersCapacityTable(self._servers,
+                                                        self._online_servers.values(),
+                                                        self._offline_servers.values())
+            self.add_observer(self._capacity_table)
+        return self._capacity_table
+
+    """ First fit trees of the online and offline servers. It is created on
+        the first call and kept up to date afterwards. """
+    def first_fit_index(self):
+        if self._first_fit_index is None:
+            self._first_fit_index = ServersFirstFitIndex(self._online_servers.values(),
+                                                         self._offline_servers.values())
+            self.add_observer(self._first_fit_index)
+        return self._first_fit_index
+
+    """ Residual buckets of the online and offline servers, for best fit
+        queries. It is created on the first call and kept up to date
+        afterwards. """
+    def best_fit_index(self):
+        if self._best_fit_index is None:
+            bucket_size = float(self._config.params.get('best_fit_index_bucket_size', 0.05))
+            self._best_fit_index = ServersBestFitIndex(self._online_servers.values(),
+                                                       self._offline_servers.values(),
+                                                       bucket_size)
+            self.add_observer(self._best_fit_index)
+        return self._best_fit_index
 
     def schedule_vm_at_server(self, vm, server_name):
         self._vm_status[vm.name].update(vm)
         vm_to_schedule = self._vm_status[vm.name].vm
         self._logger.debug('Allocating VM %s to server %s', vm_to_schedule.dump(), server_name)
         self._online_servers[server_name].schedule_vm(vm_to_schedule)
+        self._dirty_servers[server_name] = self._online_servers[server_name]
         self._vm_hosts[vm_to_schedule.name] = server_name
         self._add_finish_event(vm_to_schedule)
 
@@ -96,6 +181,7 @@ class ResourceManager:
         if server is not None:
             self._logger.debug('Updating VM demands in server %s: %s', server.describe(), vm.dump())
             server.update_vm(vm)
+            self._dirty_servers[server.name] = server
             self._logger.debug('Updated VM demands in server %s: %s', server.describe(), vm.dump())
         self._logger.debug('Updating VM demands at VM status info: %s', vm.dump())
         self._vm_status[vm.name].update(vm)
@@ -107,9 +193,18 @@ class ResourceManager:
             del self._vm_hosts[vm.name]
             self._update_vm_status_freeing_resources(vm)
             server.free_vm(vm)
+            self._dirty_servers[server.name] = server
         else:
             self._logger.error('Tried to free VM but not found: {}'.format(vm.dump()))
 
+    """ Returns the online servers whose allocated resources changed since
+        the last call, in the order of online_servers(), and forgets them. """
+    def consume_dirty_servers(self):
+        dirty_servers = sorted(self._dirty_servers.values(),
+                               key=lambda server: self._online_order[server.name])
+        self._dirty_servers = {}
+        return dirty_servers
+
     def get_server_of_vm(self, vm_name):
         server_name = self._vm_hosts.get(vm_name)
         return self._online_servers[server_name] if server_name is not None \
@@ -132,6 +227,9 @@ class ResourceManager:
     def all_servers(self):
         return list(self._online_servers.values()) + list(self._offline_servers.values())
 
+    def server_by_index(self, index):
+        return self._servers[index]
+
     def online_vms_names(self):
         return self._vm_hosts.keys()
 
@@ -147,6 +245,9 @@ class EnvironmentBuilder:
 
 
 class VirtualMachineAllocationData:
+    __slots__ = ('vm', 'submit_time', 'submit_cpu_demand', 'submit_mem_demand',
+                 'process_time', 'remaining_time', 'last_finish_time', 'finish_event')
+
     def __init__(self, vm, submit_time=0, process_time=0):
         self.vm = vm
         self.submit_time = submit_time
@@ -155,6 +256,7 @@ class VirtualMachineAllocationData:
         self.process_time = process_time
         self.remaining_time = process_time
         self.last_finish_time = None
+        self.finish_event = None
 
     def update(self, vm_with_new_demands):
         self.vm.cpu = vm_with_new_demands.cpu
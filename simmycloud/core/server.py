@@ -33,6 +33,10 @@ class Server:
 		self.mem_alloc = 0.0
 		self.cpu_free = self.cpu
 		self.mem_free = self.mem
+		# position in ResourceManager's servers list
+		self.index = None
+		# notified (server_changed) whenever the allocated resources change
+		self.observer = None
 
 	def schedule_vm(self, vm):
 		self.vm_dict[vm.name] = vm
@@ -40,6 +44,7 @@ class Server:
 		self.mem_alloc += vm.mem
 		self.cpu_free -= vm.cpu
 		self.mem_free -= vm.mem
+		if self.observer is not None: self.observer.server_changed(self)
 
 	def free_vm(self, vm):
 		vm = self.vm_dict.pop(vm.name)
@@ -47,6 +52,7 @@ class Server:
 		self.mem_alloc -= vm.mem
 		self.cpu_free += vm.cpu
 		self.mem_free += vm.mem
+		if self.observer is not None: self.observer.server_changed(self)
 		return vm
 
 	def update_vm(self, vm):
@@ -57,6 +63,7 @@ class Server:
 		self.mem_free += vm_allocated.mem - vm.mem
 		vm_allocated.cpu = vm.cpu
 		vm_allocated.mem = vm.mem
+		if self.observer is not None: self.observer.server_changed(self)
 		return vm_allocated
 
 	def vm_list(self):
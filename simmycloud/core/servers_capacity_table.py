@@ -0,0 +1,112 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+import numpy
+
+class ServersCapacityTable:
+    """ Resources of all servers in contiguous arrays, indexed by server
+        index. It observes the ResourceManager, so that the arrays are always
+        in sync with the Server objects.
+        order keeps the iteration order of ResourceManager's online and
+        offline servers: a server entering one of them gets a greater order
+        than all the others. """
+
+    def __init__(self, servers, online_servers, offline_servers):
+        self._servers = servers
+        n = len(servers)
+        self.cpu = numpy.empty(n)
+        self.mem = numpy.empty(n)
+        self.cpu_alloc = numpy.empty(n)
+        self.mem_alloc = numpy.empty(n)
+        self.cpu_free = numpy.empty(n)
+        self.mem_free = numpy.empty(n)
+        self.online = numpy.zeros(n, dtype=bool)
+        self.order = numpy.empty(n, dtype=numpy.int64)
+        self._next_order = 0
+        # ordered indexes, until a server is turned on or off
+        self._online_indexes = None
+        self._offline_indexes = None
+
+        for server in servers:
+            self._copy_resources(server)
+        for server in online_servers:
+            self.server_turned_on(server)
+        for server in offline_servers:
+            self.server_turned_off(server)
+
+    def server(self, index):
+        return self._servers[index]
+
+    """ Indexes of the online servers, in ResourceManager.online_servers() order """
+    def online_indexes(self):
+        if self._online_indexes is None:
+            self._online_indexes = self._ordered(numpy.flatnonzero(self.online))
+        return self._online_indexes
+
+    """ Indexes of the offline servers, in ResourceManager.offline_servers() order """
+    def offline_indexes(self):
+        if self._offline_indexes is None:
+            self._offline_indexes = self._ordered(numpy.flatnonzero(~self.online))
+        return self._offline_indexes
+
+    def _ordered(self, indexes):
+        return indexes[numpy.argsort(self.order[indexes])]
+
+    def server_added(self, server):
+        self.cpu = numpy.append(self.cpu, 0.0)
+        self.mem = numpy.append(self.mem, 0.0)
+        self.cpu_alloc = numpy.append(self.cpu_alloc, 0.0)
+        self.mem_alloc = numpy.append(self.mem_alloc, 0.0)
+        self.cpu_free = numpy.append(self.cpu_free, 0.0)
+        self.mem_free = numpy.append(self.mem_free, 0.0)
+        self.online = numpy.append(self.online, False)
+        self.order = numpy.append(self.order, 0)
+        self._copy_resources(server)
+        self.server_turned_off(server)
+
+    def server_changed(self, server):
+        i = server.index
+        self.cpu_alloc[i] = server.cpu_alloc
+        self.mem_alloc[i] = server.mem_alloc
+        self.cpu_free[i] = server.cpu_free
+        self.mem_free[i] = server.mem_free
+
+    def server_turned_on(self, server):
+        self.online[server.index] = True
+        self._stamp_order(server)
+
+    def server_turned_off(self, server):
+        self.online[server.index] = False
+        self._stamp_order(server)
+
+    def _copy_resources(self, server):
+        self.cpu[server.index] = server.cpu
+        self.mem[server.index] = server.mem
+        self.server_changed(server)
+
+    def _stamp_order(self, server):
+        self.order[server.index] = self._next_order
+        self._next_order += 1
+        self._online_indexes = None
+        self._offline_indexes = None
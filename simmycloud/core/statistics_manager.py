@@ -56,6 +56,11 @@ class StatisticsManager:
     def add_module(self, module):
         self._modules.append(module)
 
+    """ Any object with a notify_event(event, *args, **kwargs) method can
+        listen to an event, as statistics modules do. """
+    def add_listener(self, event, listener):
+        self._listeners[event].append(listener)
+
 
 class StatisticsModule:
 
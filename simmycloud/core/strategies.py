@@ -152,6 +152,22 @@ class PredictionStrategy(Strategy):
             return new_demands
         return new_predict
 
+    def predict_many_strategy(func):
+        def new_predict_many(self, *args, **kwargs):
+            vm_names = [arg for arg in args if isinstance(arg, list)][0]
+            predictions = func(self, *args, **kwargs)
+            for vm_name, new_demands in zip(vm_names, predictions):
+                if new_demands is not None:
+                    self._logger.debug('Predicted demands for VM %s: %f, %f',
+                                                       vm_name,
+                                                       new_demands[0],
+                                                       new_demands[1])
+                    self._config.statistics.notify_event('new_demands')
+                else:
+                    self._logger.debug('No predicted demands for VM %s', vm_name)
+            return predictions
+        return new_predict_many
+
     def next_prediction_interval_strategy(func):
         def new_next_prediction_interval(self, *args, **kwargs):
             return func(self, *args, **kwargs)
@@ -163,6 +179,12 @@ class PredictionStrategy(Strategy):
     def predict(self, vm_name):
         raise NotImplementedError
 
+    """ Returns a list with the predict() result for each VM name in the
+        vm_names list. Override this method, decorated with
+        @predict_many_strategy, if predictions are cheaper in batches. """
+    def predict_many(self, vm_names):
+        return [self.predict(vm_name) for vm_name in vm_names]
+
     """ Returns the next prediction interval. If you don't override this
         method, the 'prediction_interval' parameter in config will be returned. """
     @next_prediction_interval_strategy
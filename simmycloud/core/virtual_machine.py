@@ -23,6 +23,7 @@
 ###############################################################################
 
 class VirtualMachine:
+    __slots__ = ('name', 'cpu', 'mem')
 
     def __init__(self, name, cpu, mem):
         self.name = name
@@ -0,0 +1,216 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2013 Cassio Paixao
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+###############################################################################
+
+""" NumPy version of the rbf extension (c-src/rbf.c), which fits TISEAN's
+    radial basis function ansatz to a time series and forecasts its next
+    value. Many series (rows of a matrix) are fitted at once, vectorized
+    over the rows, with the operations of rbf.c in the same order. exp is
+    libm's, as in rbf.c, so that the results are the C module's bit by
+    bit. c-src/parity.py compares both. """
+
+import functools
+import math
+
+import numpy
+
+# the defaults of rbf.c
+DIM = 2
+DELAY = 1
+CENTER = 10
+STEP = 1
+DRIFT_STEPS = 20
+
+
+""" Same as rbf.predict: returns the forecast of the next value of the
+    values sequence, raising RuntimeError if the model can't be fitted. """
+def predict(values):
+    series = numpy.array([list(values)], dtype=float)
+    if series.shape[1] < 2:
+        raise ValueError('at least 2 values are needed')
+    prediction, error = _fit_and_forecast(series)
+    if error[0] is not None:
+        raise RuntimeError(error[0])
+    return float(prediction[0])
+
+""" Same as rbf.predict_many: values holds rows of window values (any
+    buffer or array of doubles; window may be 0 for 2-D arrays). Returns a
+    list with the forecast of each row, NaN for the rows whose model
+    couldn't be fitted. """
+def predict_many(values, window=0):
+    series = numpy.asarray(values, dtype=float)
+    if window == 0 and series.ndim == 2:
+        window = series.shape[1]
+    if window < 2 or series.size % window != 0:
+        raise ValueError('values must hold rows of window >= 2 doubles')
+    series = series.reshape(-1, window)
+    if series.shape[0] == 0:
+        return []
+    prediction, error = _fit_and_forecast(series)
+    prediction[numpy.not_equal(error, None)] = numpy.nan
+    return prediction.tolist()
+
+def _fit_and_forecast(series):
+    rows, length = series.shape
+    centers = min(CENTER, length)
+    insample = length
+    error = numpy.full(rows, None, dtype=object)
+    # one column per series: the loops below run over the first axis, and
+    # _sum adds along it in sequence, as the loops of rbf.c
+    series = numpy.ascontiguousarray(series.T)
+
+    with numpy.errstate(all='ignore'):
+        # rescale_data
+        minimum = series.min(axis=0)
+        interval = series.max(axis=0) - minimum
+        constant = interval == 0.0
+        error[constant] = ['rescale_data: data ranges from {!r} to {!r}. It makes no sense to continue.'.format(
+                            float(m), float(m)) for m in minimum[constant]]
+        series = (series - minimum) / interval
+
+        # variance
+        av = _sum(series) / length
+        var = _sum(series*series)
+        var = numpy.sqrt(numpy.fabs(var/length - av*av))
+        error[(var == 0.0) & numpy.equal(error, None)] = 'Variance of the data is zero.'
+
+        cstep = length-1-(DIM-1)*DELAY
+        center = numpy.empty((centers, DIM, rows))
+        for i in range(centers):
+            for j in range(DIM):
+                center[i, j] = series[(DIM-1)*DELAY-j*DELAY+(i*cstep)//(centers-1)]
+
+        _drift(center)
+        varianz = _avdistance(center)
+        coefs, singular = _make_fit(series, center, varianz, insample)
+        error[singular & numpy.equal(error, None)] = 'Singular matrix! Exiting!\n'
+
+        # make_cast, a single step
+        hcen = _rbf(series, length-1, center, varianz)
+        new_el = coefs[0] + coefs[1]*hcen[0]
+        for i in range(2, centers+1):
+            new_el += coefs[i]*hcen[i-1]
+
+        prediction = new_el*interval+minimum
+    return prediction, error
+
+""" rbf() of every center, for the window ending at series[n]. """
+def _rbf(series, n, center, varianz):
+    denum = 2.0*varianz*varianz
+    r = numpy.square(series[n]-center[:, 0])
+    for i in range(1, DIM):
+        r += numpy.square(series[n-i*DELAY]-center[:, i])
+    return _exp(-r/denum)
+
+""" Sum over the first axis, one element after the other. numpy.add.reduce
+    does so over many series, but sums a single one pairwise. """
+def _sum(values):
+    return functools.reduce(numpy.add, values)
+
+""" libm's exp of each element. numpy.exp may be a last bit off, which an
+    ill-conditioned fit amplifies to a different forecast. """
+def _exp(x):
+    return numpy.fromiter(map(math.exp, x.ravel().tolist()), float, x.size).reshape(x.shape)
+
+def _drift(center):
+    centers = center.shape[0]
+    step = 1e-2
+    for l in range(DRIFT_STEPS):
+        for i in range(centers):
+            h = center[i]-center
+            forces = h/numpy.square(h)/numpy.fabs(h)
+            # k == i is left out of the sum (adding 0.0 changes nothing)
+            forces[i] = 0.0
+            force = _sum(forces)
+            h = _sum(numpy.square(force))
+            step1 = step/numpy.sqrt(h)
+            moved = center[i]+step1*force
+            inside = (moved > -0.1) & (moved < 1.1)
+            center[i][inside] = moved[inside]
+
+def _avdistance(center):
+    centers = center.shape[0]
+    pairs = [(i, j) for i in range(centers) for j in range(centers) if i != j]
+    first = [i for i, j in pairs]
+    second = [j for i, j in pairs]
+    distances = numpy.square(center[first]-center[second])
+    dist = _sum(distances.reshape(-1, center.shape[2]))
+    return numpy.sqrt(dist/(centers-1)/centers/DIM)
+
+def _make_fit(series, center, varianz, insample):
+    rows = series.shape[1]
+    centers = center.shape[0]
+    coefs = numpy.zeros((centers+1, rows))
+    mat = numpy.zeros((centers+1, centers+1, rows))
+    lower = numpy.tril(numpy.ones((centers, centers), dtype=bool))[:, :, None]
+
+    for n in range((DIM-1)*DELAY, insample-STEP):
+        nst = n+STEP
+        hcen = _rbf(series, n, center, varianz)
+        coefs[0] += series[nst]
+        mat[0, 0] += 1.0
+        mat[1:, 0] += hcen
+        coefs[1:] += series[nst]*hcen
+        mat[1:, 1:] += numpy.where(lower, hcen[:, None]*hcen[None, :], 0.0)
+
+    h = float(insample-STEP-(DIM-1)*DELAY)
+    coefs /= h
+    mat /= h
+    # symmetric, from the lower triangle
+    upper = numpy.triu_indices(centers+1, 1)
+    mat[upper[0], upper[1]] = mat[upper[1], upper[0]]
+
+    # one system per series
+    coefs = numpy.ascontiguousarray(coefs.T)
+    singular = _solvele(numpy.ascontiguousarray(mat.transpose(2, 0, 1)), coefs)
+    return coefs.T, singular
+
+""" Gaussian elimination with partial pivoting of each row's system, as
+    in TISEAN's solvele. Solves in place (the solution is left at vec) and
+    returns which systems were singular. """
+def _solvele(mat, vec):
+    rows, n = vec.shape
+    singular = numpy.zeros(rows, dtype=bool)
+    everyone = numpy.arange(rows)
+    for i in range(n-1):
+        # first row with the greatest absolute value, as the strict > in C
+        maxi = i + numpy.argmax(numpy.fabs(mat[:, i:, i]), axis=1)
+        swap = maxi != i
+        if swap.any():
+            who, to = everyone[swap], maxi[swap]
+            mat[who, i], mat[who, to] = mat[who, to].copy(), mat[who, i].copy()
+            vec[who, i], vec[who, to] = vec[who, to].copy(), vec[who, i].copy()
+
+        pivot = mat[:, i, i].copy()
+        singular |= numpy.fabs(pivot) == 0.0
+        q = -mat[:, i+1:, i]/pivot[:, None]
+        mat[:, i+1:, i] = 0.0
+        mat[:, i+1:, i+1:] += q[:, :, None]*mat[:, i, None, i+1:]
+        vec[:, i+1:] += q*vec[:, i, None]
+
+    vec[:, n-1] /= mat[:, n-1, n-1]
+    for i in range(n-2, -1, -1):
+        for j in range(n-1, i, -1):
+            vec[:, i] -= mat[:, i, j]*vec[:, j]
+        vec[:, i] /= mat[:, i, i]
+    return singular
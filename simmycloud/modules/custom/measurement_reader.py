@@ -24,11 +24,19 @@
 
 
 import re
-import fileinput
 import os.path
+import mmap
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 from math import fsum
 import logging
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from core.simulation_module import SimulationModule
 
 class MeasurementReader(SimulationModule):
@@ -39,10 +47,24 @@ class MeasurementReader(SimulationModule):
     def initialize(self):
         self._last_overloaded_servers = []
         self._last_overloaded_servers_check = -1
-        self._cached = CachedMeasurement(self._config.params['measurements_directory'],
+        # the default window is the one RBF prediction reads
+        window_intervals = self._config.params.get('measurements_cache_window_intervals',
+                           self._config.params.get('rbf_time_series_prediction_window_size', 0))
+        self._cached = CachedMeasurement(self._build_measurements_storage(),
                                          int(self._config.params['measurements_interval_time']),
-                                         int(self._config.params['measurements_cache_intervals_ahead']))
+                                         int(self._config.params['measurements_cache_intervals_ahead']),
+                                         int(self._config.params.get('measurements_cache_max_rows', 0)),
+                                         int(window_intervals))
         self._cached.set_config(self._config)
+        self._config.statistics.add_listener('vm_finished', self)
+
+    def _build_measurements_storage(self):
+        measurements_format = self._config.params.get('measurements_format', 'csv')
+        if measurements_format == 'csv':
+            return MeasurementsDirectory(self._config.params['measurements_directory'])
+        elif measurements_format == 'packed':
+            return PackedMeasurements(self._config.params['measurements_directory'])
+        raise Exception('Set measurements_format param with one of these values: csv or packed.')
 
     def current_measurement(self, vm_name):
         return self.measurements_interval(vm_name,
@@ -64,20 +86,29 @@ class MeasurementReader(SimulationModule):
     def free_cache_for_vm(self, vm_name):
         self._cached.free_measurements_of_vm(vm_name)
 
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'vm_finished':
+            self.free_cache_for_vm(kwargs['vm'].name)
+
     def _check_overloaded_servers(self):
         self._logger.debug('Verifying overloaded servers on time %d',
                             self._config.simulation_info.current_timestamp)
-        overloaded_servers = []
-        for server in self._config.resource_manager.online_servers():
-            free_cpu, free_mem = server.cpu, server.mem
-            for vm in server.vm_list():
-                measurement = self.current_measurement(vm.name)
-                free_cpu -= measurement[MeasurementReader.CPU]
-                free_mem -= measurement[MeasurementReader.MEM]
-            if free_cpu < 0 or free_mem < 0:
-                overloaded_servers.append(server)
-
-        if overloaded_servers and self._logger.level <= logging.DEBUG:
+        if numpy is not None:
+            overloaded_servers = self._overloaded_servers_vectorized()
+        else:
+            overloaded_servers = []
+            for server in self._config.resource_manager.online_servers():
+                free_cpu, free_mem = server.cpu, server.mem
+                for vm in server.vm_list():
+                    measurement = self.current_measurement(vm.name)
+                    free_cpu -= measurement[MeasurementReader.CPU]
+                    free_mem -= measurement[MeasurementReader.MEM]
+                if free_cpu < 0 or free_mem < 0:
+                    overloaded_servers.append(server)
+
+        # the logger's own level is NOTSET unless set, so it says nothing
+        # about DEBUG being logged; the measured usage is only summed if it is
+        if overloaded_servers and self._logger.isEnabledFor(logging.DEBUG):
             for s in overloaded_servers:
                 cpu_use = fsum(self.current_measurement(vm.name)[MeasurementReader.CPU] for vm in s.vm_list())
                 mem_use = fsum(self.current_measurement(vm.name)[MeasurementReader.MEM] for vm in s.vm_list())
@@ -88,22 +119,60 @@ class MeasurementReader(SimulationModule):
 
         return overloaded_servers
 
+    """ The current usage of all hosted VMs is read from the cache in a
+        single pass. Each server's capacity is followed by the usage of its
+        VMs, so that a single subtract.reduceat gives the free resources of
+        all servers, subtracted in the same order (and with the same
+        rounding) as the loop above. """
+    def _overloaded_servers_vectorized(self):
+        servers = list(self._config.resource_manager.online_servers())
+        if not servers:
+            return []
+
+        first_of_server = []
+        vm_names = []
+        for server in servers:
+            first_of_server.append(len(first_of_server) + len(vm_names))
+            vm_names.extend(vm.name for vm in server.vm_list())
+        vm_cpus, vm_mems = self._cached.current_usages(vm_names,
+                                                        self._config.simulation_info.current_timestamp)
+
+        first_of_server = numpy.array(first_of_server)
+        of_vm = numpy.ones(len(servers) + len(vm_names), dtype=bool)
+        of_vm[first_of_server] = False
+        cpus = numpy.empty(len(of_vm))
+        mems = numpy.empty(len(of_vm))
+        cpus[first_of_server] = [server.cpu for server in servers]
+        mems[first_of_server] = [server.mem for server in servers]
+        cpus[of_vm] = numpy.frombuffer(vm_cpus)
+        mems[of_vm] = numpy.frombuffer(vm_mems)
+
+        free_cpu = numpy.subtract.reduceat(cpus, first_of_server)
+        free_mem = numpy.subtract.reduceat(mems, first_of_server)
+        overloaded = numpy.flatnonzero((free_cpu < 0) | (free_mem < 0))
+        return [servers[i] for i in overloaded]
 
-class CachedMeasurement:
 
-    def __init__(self, input_directory, interval_time, cache_intervals_ahead):
-        self._input_directory = input_directory
+class CachedMeasurement:
+    """ max_rows bounds the cached rows of all VMs (0 for no bound). The
+        least recently used VMs are evicted when it is exceeded.
+        window_intervals is the widest window, in intervals before the
+        current time, that will be requested. Older rows are dropped (0 to
+        keep them all). """
+    def __init__(self, storage, interval_time, cache_intervals_ahead, max_rows=0, window_intervals=0):
+        self._storage = storage
         self._interval_time = interval_time
         self._cache_intervals_ahead = cache_intervals_ahead
-        self._measurements = {}
+        self._max_rows = max_rows
+        self._window_intervals = window_intervals
+        self._measurements = OrderedDict()
+        self._rows = 0
 
     def set_config(self, config):
         self._config = config
 
     def measurements_interval(self, vm_name, from_time, till_time):
-        if vm_name not in self._measurements or \
-           self._measurements[vm_name][-1][MeasurementReader.TIME] < till_time:
-            self._caches_measurements(vm_name, from_time, till_time)
+        vm_measurements = self._cached_measurements(vm_name, from_time, till_time)
 
         from_time = from_time - self._interval_time
 
@@ -113,43 +182,217 @@ class CachedMeasurement:
                             vm_allocation_data.submit_mem_demand,
                             vm_allocation_data.submit_time
                         )]
-        if vm_name in self._measurements:
-            measurements.extend(m for m in self._measurements[vm_name] if m[MeasurementReader.TIME] > from_time and m[MeasurementReader.TIME] <= till_time)
+        measurements.extend(vm_measurements.interval(from_time, till_time))
 
         return measurements
 
+    """ Returns two arrays with the cpu and the mem of each VM at time, the
+        same as measurements_interval(vm_name, time, time)[-1], without
+        building the measurements' lists. """
+    def current_usages(self, vm_names, time):
+        cpus = array('d')
+        mems = array('d')
+        from_time = time - self._interval_time
+        for vm_name in vm_names:
+            vm_measurements = self._cached_measurements(vm_name, time, time)
+            last = bisect_right(vm_measurements.times, time) - 1
+            if last >= 0 and vm_measurements.times[last] > from_time:
+                cpus.append(vm_measurements.cpus[last])
+                mems.append(vm_measurements.mems[last])
+            else:
+                vm_allocation_data = self._config.resource_manager.get_vm_allocation_data(vm_name)
+                cpus.append(vm_allocation_data.submit_cpu_demand)
+                mems.append(vm_allocation_data.submit_mem_demand)
+        return cpus, mems
+
     def n_measurements_till(self, vm_name, n, till_time):
         from_time = till_time - (n+1)*self._interval_time
 
         return self.measurements_interval(vm_name, from_time, till_time)[-n:]
 
+    def _cached_measurements(self, vm_name, from_time, till_time):
+        if vm_name not in self._measurements:
+            self._caches_measurements(vm_name, from_time, till_time)
+            self._rows += len(self._measurements[vm_name])
+            self._evict_least_recently_used()
+        else:
+            self._measurements.move_to_end(vm_name)
+            vm_measurements = self._measurements[vm_name]
+            if vm_measurements.file_offset is not None and \
+               vm_measurements.last_time() < till_time:
+                rows = len(vm_measurements)
+                if self._window_intervals > 0:
+                    # the next requests will start after this time
+                    vm_measurements.drop_till(till_time - (self._window_intervals + 2) * self._interval_time)
+                self._caches_more_measurements(vm_name, till_time)
+                self._rows += len(vm_measurements) - rows
+                self._evict_least_recently_used()
+        return self._measurements[vm_name]
+
     def _caches_measurements(self, vm_name, from_time, till_time):
-        path = re.sub('(\d+)-(\d+)', '\\1/\\1-\\2.csv', vm_name)
-        filepath = '{}/{}'.format(self._input_directory, path)
+        measurements = VMMeasurements()
+        self._measurements[vm_name] = measurements
 
-        measurements = []
+        opened_file = self._storage.open(vm_name)
+        if opened_file is None:
+            return
 
-        if os.path.isfile(filepath): #verifies if file exists
-            opened_file = fileinput.input(filepath)
+        if self._window_intervals > 0:
+            # later requests may reach further back than this one
+            from_time = min(from_time, till_time - (self._window_intervals + 1) * self._interval_time)
+        elif self._max_rows > 0:
+            # an evicted VM may be requested for any of its measurements
+            from_time = 0
 
+        with opened_file:
             line = opened_file.readline()
             while len(line) > 0:
-                start_time, end_time, cpu, mem = line.split(',')
-                if int(end_time)   < from_time:
-                    line = opened_file.readline()
-                    continue
-                if int(start_time) > till_time: break
-
-                # (cpu, mem, start_time)
-                measurements.append( (float(cpu), float(mem), int(start_time)) )
-
+                start_time, end_time, cpu, mem = line.split(b',')
+                if int(end_time) >= from_time:
+                    measurements.append(float(cpu), float(mem), int(start_time))
+                    break
                 line = opened_file.readline()
 
-            opened_file.close()
-
-        self._measurements[vm_name] = measurements
-
-        if not measurements: del self._measurements[vm_name]
+            if len(measurements) == 0:
+                measurements.file_offset = None
+            elif measurements.last_time() < till_time:
+                # goes on in the file already opened
+                self._read_ahead(measurements, opened_file, till_time)
+            else:
+                measurements.file_offset = opened_file.tell()
+
+    def _caches_more_measurements(self, vm_name, till_time):
+        measurements = self._measurements[vm_name]
+        with self._storage.open(vm_name) as opened_file:
+            opened_file.seek(measurements.file_offset)
+            self._read_ahead(measurements, opened_file, till_time)
+
+    """ Reads the VM's measurements from the opened file's position till
+        the first one that starts after the read-ahead window. """
+    def _read_ahead(self, measurements, opened_file, till_time):
+        read_till = till_time + self._cache_intervals_ahead * self._interval_time
+        line = opened_file.readline()
+        while len(line) > 0:
+            start_time, end_time, cpu, mem = line.split(b',')
+            measurements.append(float(cpu), float(mem), int(start_time))
+            if measurements.last_time() > read_till: break
+            line = opened_file.readline()
+        measurements.file_offset = opened_file.tell() if len(line) > 0 else None
 
     def free_measurements_of_vm(self, vm_name):
-        self._measurements.pop(vm_name, None)
+        vm_measurements = self._measurements.pop(vm_name, None)
+        if vm_measurements is not None:
+            self._rows -= len(vm_measurements)
+
+    def _evict_least_recently_used(self):
+        if self._max_rows <= 0: return
+        # the most recently used VM is never evicted
+        while self._rows > self._max_rows and len(self._measurements) > 1:
+            _, vm_measurements = self._measurements.popitem(last=False)
+            self._rows -= len(vm_measurements)
+
+
+class VMMeasurements:
+    """ Measurements of a VM, kept in parallel arrays sorted by start time,
+        so that time windows are found by binary search. """
+    __slots__ = ('times', 'cpus', 'mems', 'file_offset')
+
+    def __init__(self):
+        self.times = array('q')
+        self.cpus = array('d')
+        self.mems = array('d')
+        # where the next measurements start in the VM's file. None when it was read till the end
+        self.file_offset = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, cpu, mem, start_time):
+        self.times.append(start_time)
+        self.cpus.append(cpu)
+        self.mems.append(mem)
+
+    def last_time(self):
+        return self.times[-1]
+
+    def drop_till(self, time):
+        first = bisect_right(self.times, time)
+        if first > 0:
+            del self.times[:first]
+            del self.cpus[:first]
+            del self.mems[:first]
+
+    """ Returns (cpu, mem, start_time) of the measurements that started in
+        the interval (from_time, till_time]. """
+    def interval(self, from_time, till_time):
+        first = bisect_right(self.times, from_time)
+        last = bisect_right(self.times, till_time, first)
+        return zip(self.cpus[first:last],
+                   self.mems[first:last],
+                   self.times[first:last])
+
+
+class MeasurementsDirectory:
+    """ One CSV file of measurements per VM: job_id/job_id-task_index.csv """
+    def __init__(self, input_directory):
+        self._input_directory = input_directory
+
+    def open(self, vm_name):
+        path = re.sub('(\d+)-(\d+)', '\\1/\\1-\\2.csv', vm_name)
+        filepath = '{}/{}'.format(self._input_directory, path)
+        if not os.path.isfile(filepath): #verifies if file exists
+            return None
+        return open(filepath, 'rb')
+
+
+class PackedMeasurements:
+    """ Measurements of all VMs in a single file, created with
+        scripts/convert_task_usage.py --packed. The data file is mapped in
+        memory and an index gives where the measurements of each VM are. """
+    DATA_FILE = 'task_usage.dat'
+    INDEX_FILE = 'task_usage.idx'
+
+    def __init__(self, input_directory):
+        self._index = {}
+        with open('{}/{}'.format(input_directory, PackedMeasurements.INDEX_FILE)) as index:
+            for line in index:
+                vm_name, offset, length = line.split(',')
+                self._index[vm_name] = (int(offset), int(length))
+
+        self._file = open('{}/{}'.format(input_directory, PackedMeasurements.DATA_FILE), 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+                     if self._index else b''
+
+    def open(self, vm_name):
+        if vm_name not in self._index:
+            return None
+        offset, length = self._index[vm_name]
+        return PackedVMMeasurements(self._data, offset, offset + length)
+
+
+class PackedVMMeasurements:
+    """ File-like view of the measurements of a VM in the packed data. """
+    def __init__(self, data, start, end):
+        self._data = data
+        self._start = start
+        self._end = end
+        self._position = start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def readline(self):
+        line_end = self._data.find(b'\n', self._position, self._end)
+        line_end = self._end if line_end < 0 else line_end + 1
+        line = self._data[self._position:line_end]
+        self._position = line_end
+        return line
+
+    def tell(self):
+        return self._position - self._start
+
+    def seek(self, offset):
+        self._position = self._start + offset
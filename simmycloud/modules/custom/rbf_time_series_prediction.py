@@ -23,11 +23,52 @@
 ###############################################################################
 
 
-import modules.custom.lib.rbf as rbf
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from math import ceil
 
 from core.simulation_module import SimulationModule
 
 class RBFTimeSeriesPrediction(SimulationModule):
 
+    def initialize(self):
+        # imported here, so that the numpy backend runs where the extension is not built
+        backend = self._config.params.get('rbf_time_series_prediction_backend', 'c')
+        if backend == 'c':
+            import modules.custom.lib.rbf as rbf
+        elif backend == 'numpy':
+            import modules.custom.lib.numpy_rbf as rbf
+        else:
+            raise Exception('Set rbf_time_series_prediction_backend param with one of these values: c or numpy.')
+        self.rbf = rbf
+
+        # the rbf extension releases the GIL while fitting, so predict_many
+        # can split its rows among threads
+        self.threads = int(self._config.params.get('rbf_time_series_prediction_threads', 1))
+        self.executor = None
+        if self.threads > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.threads)
+            self._config.statistics.add_listener('simulation_finished', self)
+
     def predict(self, values):
-        return rbf.predict(values)
+        return self.rbf.predict(values)
+
+    """ values is a buffer of doubles (e.g. array.array('d')) with rows of
+        window values, one after the other. Returns a list with the
+        prediction of each row, NaN where it could not be made. """
+    def predict_many(self, values, window):
+        if self.executor is None:
+            return self.rbf.predict_many(values, window)
+
+        values = memoryview(values).cast('B').cast('d')
+        rows = len(values) // window
+        rows_per_thread = max(ceil(rows / self.threads), 1)
+        chunks = [values[first*window:(first+rows_per_thread)*window]
+                  for first in range(0, rows, rows_per_thread)]
+        return list(chain.from_iterable(
+            self.executor.map(self.rbf.predict_many, chunks, [window] * len(chunks))))
+
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'simulation_finished' and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -65,8 +65,13 @@ class PredictionErrorStatistics(StatisticsModule):
 
     def _update_base(self):
         self.prediction_base[:] = []
-        for vm_name in self._config.resource_manager.online_vms_names():
-            prediction = self._config.strategies.prediction.predict(vm_name)
+        vm_names = list(self._config.resource_manager.online_vms_names())
+        # the same predictions the simulator makes, in its worker processes if it has them
+        if self._config.parallel_prediction is not None:
+            predictions = self._config.parallel_prediction.predict_many(vm_names)
+        else:
+            predictions = self._config.strategies.prediction.predict_many(vm_names)
+        for vm_name, prediction in zip(vm_names, predictions):
             if prediction:
                 self.prediction_base.append((
                     prediction, #already a tuple
@@ -126,4 +126,6 @@ class StandardStatistics(StatisticsModule):
         self._add_field(CounterField('servers_turned_off'))
         self._add_field(CounterField('vms_not_allocated'))
         self._add_field(CounterField('couldnot_reallocate'))
+        self._add_field(CounterField('prediction_memo_hits'))
+        self._add_field(CounterField('prediction_memo_misses'))
         self._add_field(TimeIntervalSinceLastStatisticsField('interval_time'))
@@ -30,7 +30,9 @@ class MigrateIfOverload(MigrationStrategy):
     @MigrationStrategy.list_of_vms_to_migrate_strategy
     def list_of_vms_to_migrate(self, list_of_online_servers):
         vms_to_migrate = list()
-        overloaded_servers = (s for s in self._config.resource_manager.online_servers() if s.is_overloaded())
+        # a server can only get overloaded when its allocation changes. The
+        # servers overloaded at the last call had VMs freed, so they changed.
+        overloaded_servers = (s for s in self._config.resource_manager.consume_dirty_servers() if s.is_overloaded())
         for server in overloaded_servers:
             vms = sorted(server.vm_list(), key=self.size_of_vm)
             cpu_exceeded = -server.cpu_free
@@ -23,20 +23,28 @@
 ###############################################################################
 
 
+from core.prediction_memo import PredictionMemo
 from core.strategies import PredictionStrategy
 
 class LastFiveMeasurementsPrediction(PredictionStrategy):
 
     def initialize(self):
         self.measurement_reader = self._config.module['MeasurementReader']
+        self.memo = PredictionMemo(self._config)
 
     @PredictionStrategy.predict_strategy
     def predict(self, vm_name):
         last_five = self._get_last_five(vm_name)
-        cpu_average = sum(m[self.measurement_reader.CPU] for m in last_five) / len(last_five)
-        mem_average = sum(m[self.measurement_reader.MEM] for m in last_five) / len(last_five)
-        return (min(cpu_average, 1.0),
-                min(mem_average, 1.0))
+        cpus = tuple(m[self.measurement_reader.CPU] for m in last_five)
+        mems = tuple(m[self.measurement_reader.MEM] for m in last_five)
+        window = cpus + mems
+        new_demands = self.memo.lookup(vm_name, window)
+        if new_demands is PredictionMemo.MISS:
+            new_demands = (min(sum(cpus) / len(last_five), 1.0),
+                           min(sum(mems) / len(last_five), 1.0))
+            self.memo.store(vm_name, window, new_demands)
+        self.memo.notify_statistics()
+        return new_demands
 
     def _get_last_five(self, vm_name):
         measurements = self.measurement_reader.n_measurements_till(
@@ -24,7 +24,9 @@
 
 import logging
 import math
+from array import array
 
+from core.prediction_memo import PredictionMemo
 from core.strategies import PredictionStrategy
 
 class RBFPrediction(PredictionStrategy):
@@ -33,20 +35,75 @@ class RBFPrediction(PredictionStrategy):
         self.measurement_reader = self._config.module['MeasurementReader']
         self.rbf_prediction = self._config.module['RBFTimeSeriesPrediction']
         self.rbf_window_size = int(self._config.params['rbf_time_series_prediction_window_size'])
+        self.memo = PredictionMemo(self._config)
 
     @PredictionStrategy.predict_strategy
     def predict(self, vm_name):
         last_measurements = self._get_last(vm_name, self.rbf_window_size)
-        if self._logger.level <= logging.DEBUG:
+        if self._logger.isEnabledFor(logging.DEBUG):
             self._logger.debug('Prediction called for vm %s. Last measurements: [%s]',
-                                vm_name,
-                                ', '.join('({},{})'.format(m[self.measurement_reader.CPU], m[self.measurement_reader.MEM]) for m in last_measurements))
+                                vm_name, self._dump(last_measurements))
 
         if len(last_measurements) < self.rbf_window_size:
             self._logger.debug('No prediction. %d measurements found.', len(last_measurements))
             return None
 
-        return self._new_demands(last_measurements)
+        window = self._window_of(last_measurements)
+        new_demands = self.memo.lookup(vm_name, window)
+        if new_demands is PredictionMemo.MISS:
+            new_demands = self._new_demands(last_measurements)
+            self.memo.store(vm_name, window, new_demands)
+        self.memo.notify_statistics()
+        return new_demands
+
+    @PredictionStrategy.predict_many_strategy
+    def predict_many(self, vm_names):
+        predictions = [None] * len(vm_names)
+        predicted = []
+        windows = []
+        measured = []
+        cpus = array('d')
+        mems = array('d')
+        for i, vm_name in enumerate(vm_names):
+            last_measurements = self._get_last(vm_name, self.rbf_window_size)
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug('Prediction called for vm %s. Last measurements: [%s]',
+                                    vm_name, self._dump(last_measurements))
+            if len(last_measurements) < self.rbf_window_size:
+                self._logger.debug('No prediction for vm %s. %d measurements found.', vm_name, len(last_measurements))
+                continue
+            window = self._window_of(last_measurements)
+            new_demands = self.memo.lookup(vm_name, window)
+            if new_demands is not PredictionMemo.MISS:
+                predictions[i] = new_demands
+                continue
+            predicted.append(i)
+            windows.append(window)
+            measured.append(last_measurements)
+            cpus.extend(m[self.measurement_reader.CPU] for m in last_measurements)
+            mems.extend(m[self.measurement_reader.MEM] for m in last_measurements)
+        self.memo.notify_statistics()
+
+        if not predicted:
+            return predictions
+
+        # a single call for all the VMs' windows; NaN where the fit failed
+        new_cpus = self.rbf_prediction.predict_many(cpus, self.rbf_window_size)
+        new_mems = self.rbf_prediction.predict_many(mems, self.rbf_window_size)
+        for i, window, measurements, new_cpu, new_mem in zip(predicted, windows, measured, new_cpus, new_mems):
+            if math.isnan(new_cpu) or math.isnan(new_mem):
+                self._logger.info('RBF exception error: no prediction for vm %s: cpu( %s ) mem( %s )',
+                                  vm_names[i], new_cpu, new_mem)
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug('RBF exception values: [%s]', self._dump(measurements))
+            else:
+                predictions[i] = (max(min(new_cpu, 1), 0), max(min(new_mem, 1), 0))
+            self.memo.store(vm_names[i], window, predictions[i])
+        return predictions
+
+    def _window_of(self, measurements):
+        return tuple(m[self.measurement_reader.CPU] for m in measurements) + \
+               tuple(m[self.measurement_reader.MEM] for m in measurements)
 
     def _get_last(self, vm_name, window_size):
         return self.measurement_reader.n_measurements_till(
@@ -65,7 +122,9 @@ class RBFPrediction(PredictionStrategy):
             return (new_cpu, new_mem)
         except Exception as e:
             self._logger.info('RBF exception error: %s', e)
-            if self._logger.level <= logging.DEBUG:
-                self._logger.debug( 'RBF exception values: [%s]',
-                                    ', '.join('({},{})'.format(m[self.measurement_reader.CPU], m[self.measurement_reader.MEM]) for m in measurements))
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug('RBF exception values: [%s]', self._dump(measurements))
             return None
+
+    def _dump(self, measurements):
+        return ', '.join('({},{})'.format(m[self.measurement_reader.CPU], m[self.measurement_reader.MEM]) for m in measurements)
@@ -33,12 +33,11 @@ class BestFit(SchedulingStrategy):
             self.schedule_vm(vm)
 
     def schedule_vm(self, vm):
-        server = self.get_best_fit(vm,
-                                   self._config.resource_manager.online_servers())
+        best_fit_index = self._config.resource_manager.best_fit_index()
+        server = best_fit_index.online.greatest_dot_product(vm.cpu, vm.mem)
 
         if server is None:
-            server = self.get_best_fit(vm,
-                                       self._config.resource_manager.offline_servers())
+            server = best_fit_index.offline.greatest_dot_product(vm.cpu, vm.mem)
             if server is not None:
                 self._config.resource_manager.turn_on_server(server.name)
 
@@ -47,19 +46,41 @@ class BestFit(SchedulingStrategy):
 
         return server
 
-
-    def get_best_fit(self, vm, servers):
-        best = None
-        max_dot_product = -1
-        for server in servers:
-            if server.cpu - server.cpu_alloc >= vm.cpu and \
-               server.mem - server.mem_alloc >= vm.mem:
-                if self.dot_product(server, vm) > max_dot_product:
-                    best = server
-                    max_dot_product = self.dot_product(server, vm)
-        return best
-
     def dot_product(self, server, vm):
         cpu_product = (server.cpu - server.cpu_alloc) * vm.cpu
         mem_product = (server.mem - server.mem_alloc) * vm.mem
         return cpu_product + mem_product
+
+
+class VectorizedBestFit(BestFit):
+    """ Same placements as BestFit, scoring a VM against all servers at
+        once in the ResourceManager's capacity table (requires NumPy). """
+
+    def initialize(self):
+        self._table = self._config.resource_manager.capacity_table()
+
+    def schedule_vm(self, vm):
+        server = self.get_best_fit_in_table(vm, self._table.online_indexes())
+
+        if server is None:
+            server = self.get_best_fit_in_table(vm, self._table.offline_indexes())
+            if server is not None:
+                self._config.resource_manager.turn_on_server(server.name)
+
+        if server is not None:
+            self._config.resource_manager.schedule_vm_at_server(vm, server.name)
+
+        return server
+
+    def get_best_fit_in_table(self, vm, indexes):
+        if len(indexes) == 0:
+            return None
+        cpu_remaining = self._table.cpu[indexes] - self._table.cpu_alloc[indexes]
+        mem_remaining = self._table.mem[indexes] - self._table.mem_alloc[indexes]
+        fits = (cpu_remaining >= vm.cpu) & (mem_remaining >= vm.mem)
+        if not fits.any():
+            return None
+        # same as dot_product. argmax keeps the first server among the best ones
+        dot_products = cpu_remaining * vm.cpu + mem_remaining * vm.mem
+        dot_products[~fits] = float('-inf')
+        return self._table.server(indexes[dot_products.argmax()])
@@ -44,8 +44,8 @@ class BestFitDecreasing(GabayZaourarAlgorithm):
                     break
 
             if feasible_bin is None:
-                feasible_bin = self.get_smallest_feasible_bin(item,
-                                                              self._config.resource_manager.offline_servers())
+                feasible_bin = self.get_smallest_feasible_bin_in_buckets(item,
+                                                                         self._config.resource_manager.best_fit_index().offline)
                 if feasible_bin is not None:
                     self._config.resource_manager.turn_on_server(feasible_bin.name)
                     sorted_bins = sorted(list(self._config.resource_manager.online_servers()),
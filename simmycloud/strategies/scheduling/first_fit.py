@@ -33,12 +33,11 @@ class FirstFit(SchedulingStrategy):
             self.schedule_vm(vm)
 
     def schedule_vm(self, vm):
-        server = self.get_first_fit(vm,
-                                    self._config.resource_manager.online_servers())
+        first_fit_index = self._config.resource_manager.first_fit_index()
+        server = first_fit_index.online.first_fit(vm.cpu, vm.mem)
 
         if server is None:
-            server = self.get_first_fit(vm,
-                                        self._config.resource_manager.offline_servers())
+            server = first_fit_index.offline.first_fit(vm.cpu, vm.mem)
             if server is not None:
                 self._config.resource_manager.turn_on_server(server.name)
 
@@ -46,9 +45,28 @@ class FirstFit(SchedulingStrategy):
             self._config.resource_manager.schedule_vm_at_server(vm, server.name)
 
 
-    def get_first_fit(self, vm, servers):
-        for server in servers:
-            if server.cpu_free >= vm.cpu and \
-               server.mem_free >= vm.mem:
-                return server
-        return None
+class VectorizedFirstFit(FirstFit):
+    """ Same placements as FirstFit, testing a VM against all servers at
+        once in the ResourceManager's capacity table (requires NumPy). """
+
+    def initialize(self):
+        self._table = self._config.resource_manager.capacity_table()
+
+    def schedule_vm(self, vm):
+        server = self.get_first_fit_in_table(vm, self._table.online_indexes())
+
+        if server is None:
+            server = self.get_first_fit_in_table(vm, self._table.offline_indexes())
+            if server is not None:
+                self._config.resource_manager.turn_on_server(server.name)
+
+        if server is not None:
+            self._config.resource_manager.schedule_vm_at_server(vm, server.name)
+
+    def get_first_fit_in_table(self, vm, indexes):
+        if len(indexes) == 0:
+            return None
+        fits = (self._table.cpu_free[indexes] >= vm.cpu) & \
+               (self._table.mem_free[indexes] >= vm.mem)
+        first = fits.argmax()
+        return self._table.server(indexes[first]) if fits[first] else None
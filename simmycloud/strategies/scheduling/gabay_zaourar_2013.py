@@ -23,8 +23,15 @@
 ###############################################################################
 
 import heapq
+from math import ceil
 from multiprocessing import Pool
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from core.items_by_size import ItemsBySize
 from core.strategies import SchedulingStrategy
 
 
@@ -34,12 +41,27 @@ class GabayZaourarAlgorithm(SchedulingStrategy):
         coeficient = self._config.params['bfd_measure_coeficient_function']
         self.processors_to_use = int(self._config.params['bfd_processors_to_use'])
         self.parallel_serial_threshold = int(self._config.params['bfd_parallel_serial_threshold'])
+        # sizes computation above the threshold: numpy or pool
+        self.parallel_backend = self._config.params.get('bfd_parallel_backend',
+                                                        'numpy' if numpy is not None else 'pool')
+        self.pool = None
+        if self.parallel_backend == 'pool':
+            # created once, it lives till the simulation is finished
+            self.pool = Pool(processes=self.processors_to_use)
+            self._config.statistics.add_listener('simulation_finished', self)
+        elif self.parallel_backend != 'numpy' or numpy is None:
+            raise Exception('Set bfd_parallel_backend param with one of these values: numpy (requires NumPy) or pool.')
+        # 0 recomputes all sizes on every placement. See IncrementalSizes
+        self.size_tolerance = float(self._config.params.get('bfd_size_tolerance', 0))
         if coeficient == '1/C(j)':
             self.coeficient_function = frac_1_cj
+            self.coeficient_of_sums = frac_1_cj_of_sums
         elif coeficient == '1/R(j)':
             self.coeficient_function = frac_1_rj
+            self.coeficient_of_sums = frac_1_rj_of_sums
         elif coeficient == 'R(j)/C(j)':
             self.coeficient_function = frac_rj_cj
+            self.coeficient_of_sums = frac_rj_cj_of_sums
         else:
             raise 'Set bfd_measure_coeficient_function param with one of these values: 1/C(j), 1/R(j) or R(j)/C(j).'
 
@@ -64,14 +86,14 @@ class GabayZaourarAlgorithm(SchedulingStrategy):
         self.s_b = {}
 
         if len(bins) + len(items) > self.parallel_serial_threshold:
-            with Pool(processes=self.processors_to_use) as pool:
-                item_values = pool.map(_gabay_zaourar_compute_item_size, items)
-                for item_value in item_values:
-                    self.s_i[item_value[0]] = item_value[1]
-
-                bin_values = pool.map(_gabay_zaourar_compute_bin_size, bins)
-                for bin_value in bin_values:
-                    self.s_b[bin_value[0]] = bin_value[1]
+            item_values = [(item.name, item.cpu, item.mem) for item in items]
+            bin_values = [(bin.name, bin.cpu_free, bin.mem_free) for bin in bins]
+            if self.parallel_backend == 'pool':
+                self.s_i = self._pool_sizes(alpha, item_values)
+                self.s_b = self._pool_sizes(beta, bin_values)
+            else:
+                self.s_i = _numpy_sizes(alpha, item_values)
+                self.s_b = _numpy_sizes(beta, bin_values)
         else:
             for item in items:
                 self.s_i[item.name] = alpha_cpu*item.cpu + alpha_mem*item.mem
@@ -79,6 +101,24 @@ class GabayZaourarAlgorithm(SchedulingStrategy):
             for bin in bins:
                 self.s_b[bin.name] = beta_cpu*bin.cpu_free + beta_mem*bin.mem_free
 
+    def _pool_sizes(self, coeficient, values):
+        chunk_size = max(ceil(len(values) / self.processors_to_use), 1)
+        chunks = [values[i:i+chunk_size] for i in range(0, len(values), chunk_size)]
+        sizes = {}
+        for chunk_sizes in self.pool.starmap(_gabay_zaourar_compute_sizes,
+                                             [(coeficient[0], coeficient[1], chunk) for chunk in chunks]):
+            sizes.update(chunk_sizes)
+        return sizes
+
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'simulation_finished' and self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def set_coeficients(self, alpha):
+        global alpha_cpu, alpha_mem, beta_cpu, beta_mem
+        alpha_cpu, alpha_mem = alpha[0], alpha[1]
+        beta_cpu, beta_mem = alpha[0], alpha[1]
 
     def get_biggest_item(self, items):
         return max(items, key=self.size_of_item)
@@ -93,6 +133,11 @@ class GabayZaourarAlgorithm(SchedulingStrategy):
         except ValueError:
             return None
 
+    """ Same as get_smallest_feasible_bin over the servers in the given
+        residual buckets, with bin sizes computed by the last compute_sizes. """
+    def get_smallest_feasible_bin_in_buckets(self, item, buckets):
+        return buckets.smallest_feasible(item.cpu, item.mem, beta_cpu, beta_mem)
+
     def get_biggest_feasible_item(self, items, bin):
         feasible_items = (item for item in items if fits(item, bin))
         try:
@@ -111,6 +156,10 @@ class BFDItemCentric(GabayZaourarAlgorithm):
 
     @SchedulingStrategy.schedule_vms_strategy
     def schedule_vms(self, vms):
+        if self.size_tolerance > 0:
+            self.schedule_vms_incrementally(vms)
+            return
+
         unpacked_items = list(vms)
 
         while len(unpacked_items) > 0:
@@ -118,14 +167,14 @@ class BFDItemCentric(GabayZaourarAlgorithm):
                                self._config.resource_manager.online_servers())
             biggest_item = self.get_biggest_item(unpacked_items)
 
-            bin = self.get_smallest_feasible_bin(biggest_item,
-                                                 self._config.resource_manager.online_servers())
+            bin = self.get_smallest_feasible_bin_in_buckets(biggest_item,
+                                                            self._config.resource_manager.best_fit_index().online)
 
             if bin is None:
                 self.compute_sizes(unpacked_items,
                                    self._config.resource_manager.offline_servers())
-                bin = self.get_smallest_feasible_bin(biggest_item,
-                                                     self._config.resource_manager.offline_servers())
+                bin = self.get_smallest_feasible_bin_in_buckets(biggest_item,
+                                                                self._config.resource_manager.best_fit_index().offline)
                 if bin is not None:
                     self._config.resource_manager.turn_on_server(bin.name)
 
@@ -134,6 +183,41 @@ class BFDItemCentric(GabayZaourarAlgorithm):
 
             unpacked_items.remove(biggest_item)
 
+    def schedule_vms_incrementally(self, vms):
+        online_servers = self._config.resource_manager.online_servers()
+        sizes = IncrementalSizes(self.coeficient_of_sums, self.size_tolerance)
+        sizes.reset(vms, online_servers)
+        # ties are broken by the items' order, as in get_biggest_item
+        item_heap = [(-sizes.item_size(item), i, item) for i, item in enumerate(vms)]
+        heapq.heapify(item_heap)
+
+        while len(item_heap) > 0:
+            if sizes.drifted():
+                sizes.reset([entry[2] for entry in item_heap], online_servers)
+                item_heap = [(-sizes.item_size(entry[2]), entry[1], entry[2]) for entry in item_heap]
+                heapq.heapify(item_heap)
+
+            biggest_item = heapq.heappop(item_heap)[2]
+            self.set_coeficients(sizes.coeficient())
+            bin = self.get_smallest_feasible_bin_in_buckets(biggest_item,
+                                                            self._config.resource_manager.best_fit_index().online)
+
+            if bin is None:
+                offline_servers = self._config.resource_manager.offline_servers()
+                self.set_coeficients(self.coeficient_function([biggest_item] + [entry[2] for entry in item_heap],
+                                                              offline_servers))
+                bin = self.get_smallest_feasible_bin_in_buckets(biggest_item,
+                                                                self._config.resource_manager.best_fit_index().offline)
+                if bin is not None:
+                    self._config.resource_manager.turn_on_server(bin.name)
+                    sizes.bin_added(bin)
+
+            if bin is not None:
+                self._config.resource_manager.schedule_vm_at_server(biggest_item, bin.name)
+                sizes.item_placed(biggest_item)
+
+            sizes.item_removed(biggest_item)
+
 
 class BFDBinCentric(GabayZaourarAlgorithm):
 
@@ -141,9 +225,12 @@ class BFDBinCentric(GabayZaourarAlgorithm):
     def schedule_vms(self, vms):
         remaining_vms = self.schedule_vms_at_servers(vms, self._config.resource_manager.online_servers())
         if len(remaining_vms) > 0:
-            remaining_vms = self.schedule_vms_at_servers(vms, self._config.resource_manager.offline_servers(), active_bins=False)
+            remaining_vms = self.schedule_vms_at_servers(remaining_vms, self._config.resource_manager.offline_servers(), active_bins=False)
 
     def schedule_vms_at_servers(self, vms, bins, active_bins=True):
+        if self.size_tolerance > 0:
+            return self.schedule_vms_at_servers_incrementally(vms, bins, active_bins)
+
         list_of_bins = list(bins)
         unpacked_items = list(vms)
 
@@ -170,6 +257,93 @@ class BFDBinCentric(GabayZaourarAlgorithm):
 
         return unpacked_items
 
+    def schedule_vms_at_servers_incrementally(self, vms, bins, active_bins=True):
+        sizes = IncrementalSizes(self.coeficient_of_sums, self.size_tolerance)
+        unpacked_items = list(vms)
+        sizes.reset(unpacked_items, bins)
+        # ties are broken by the bins' and items' order, as in get_smallest_bin
+        # and get_biggest_feasible_item
+        bin_heap = [(sizes.bin_size(bin), i, bin) for i, bin in enumerate(bins)]
+        heapq.heapify(bin_heap)
+        items_by_size = ItemsBySize(unpacked_items, sizes.item_size)
+
+        while len(bin_heap) > 0:
+            if sizes.drifted():
+                unpacked_items = [item for item in unpacked_items if item in items_by_size]
+                sizes.reset(unpacked_items, [entry[2] for entry in bin_heap])
+                bin_heap = [(sizes.bin_size(entry[2]), entry[1], entry[2]) for entry in bin_heap]
+                heapq.heapify(bin_heap)
+                items_by_size = ItemsBySize(unpacked_items, sizes.item_size)
+
+            smallest_bin = heapq.heappop(bin_heap)[2]
+            have_used_bin = False
+
+            item = items_by_size.biggest_feasible(smallest_bin)
+            while item is not None:
+                if not have_used_bin and not active_bins:
+                    self._config.resource_manager.turn_on_server(smallest_bin.name)
+
+                self._config.resource_manager.schedule_vm_at_server(item, smallest_bin.name)
+                have_used_bin = True
+                items_by_size.remove(item)
+                sizes.item_placed(item)
+                sizes.item_removed(item)
+
+                item = items_by_size.biggest_feasible(smallest_bin)
+
+            sizes.bin_removed(smallest_bin)
+
+        return [item for item in unpacked_items if item in items_by_size]
+
+
+class IncrementalSizes:
+    """ Keeps the C(j) (free resources of the bins) and R(j) (demands of
+        the items) sums up to date on each placement, instead of summing
+        them again. Item and bin sizes use the coeficients of the last
+        reset, which must be done again when drifted() tells the current
+        coeficients moved more than tolerance (relative) away from them. """
+
+    def __init__(self, coeficient_of_sums, tolerance):
+        self._coeficient_of_sums = coeficient_of_sums
+        self._tolerance = tolerance
+
+    def reset(self, items, bins):
+        self.c_cpu = sum(b.cpu_free for b in bins)
+        self.c_mem = sum(b.mem_free for b in bins)
+        self.r_cpu = sum(i.cpu for i in items)
+        self.r_mem = sum(i.mem for i in items)
+        self._reset_coeficient = self.coeficient()
+
+    def coeficient(self):
+        return self._coeficient_of_sums(self.c_cpu, self.c_mem, self.r_cpu, self.r_mem)
+
+    def drifted(self):
+        return any(abs(current - reset) > self._tolerance * abs(reset)
+                   for current, reset in zip(self.coeficient(), self._reset_coeficient))
+
+    def item_size(self, item):
+        return self._reset_coeficient[0]*item.cpu + self._reset_coeficient[1]*item.mem
+
+    def bin_size(self, bin):
+        return self._reset_coeficient[0]*bin.cpu_free + self._reset_coeficient[1]*bin.mem_free
+
+    """ item was placed at one of the bins """
+    def item_placed(self, item):
+        self.c_cpu -= item.cpu
+        self.c_mem -= item.mem
+
+    def item_removed(self, item):
+        self.r_cpu -= item.cpu
+        self.r_mem -= item.mem
+
+    def bin_added(self, bin):
+        self.c_cpu += bin.cpu_free
+        self.c_mem += bin.mem_free
+
+    def bin_removed(self, bin):
+        self.c_cpu -= bin.cpu_free
+        self.c_mem -= bin.mem_free
+
 
 def fits(item, bin):
     return bin.cpu_free >= item.cpu and bin.mem_free >= item.mem
@@ -186,6 +360,20 @@ def frac_1_rj(items, bins):
     return (gabay_zaourar_one/max(sum(i.cpu for i in items), gabay_zaourar_min_divisor),
             gabay_zaourar_one/max(sum(i.mem for i in items), gabay_zaourar_min_divisor))
 
+def frac_1_cj_of_sums(c_cpu, c_mem, r_cpu, r_mem):
+    return (gabay_zaourar_one/max(c_cpu, gabay_zaourar_min_divisor),
+            gabay_zaourar_one/max(c_mem, gabay_zaourar_min_divisor))
+
+def frac_1_rj_of_sums(c_cpu, c_mem, r_cpu, r_mem):
+    return (gabay_zaourar_one/max(r_cpu, gabay_zaourar_min_divisor),
+            gabay_zaourar_one/max(r_mem, gabay_zaourar_min_divisor))
+
+def frac_rj_cj_of_sums(c_cpu, c_mem, r_cpu, r_mem):
+    frac_cj = frac_1_cj_of_sums(c_cpu, c_mem, r_cpu, r_mem)
+    frac_rj = frac_1_rj_of_sums(c_cpu, c_mem, r_cpu, r_mem)
+    return (frac_cj[0]/frac_rj[0],
+            frac_cj[1]/frac_rj[1])
+
 def frac_rj_cj(items, bins):
     frac_cj = frac_1_cj(items, bins)
     frac_rj = frac_1_rj(items, bins)
@@ -197,8 +385,14 @@ def frac_rj_cj(items, bins):
 
 alpha_cpu = alpha_mem = beta_cpu = beta_mem = None
 
-def _gabay_zaourar_compute_item_size(item):
-    return (item.name, alpha_cpu*item.cpu + alpha_mem*item.mem)
-
-def _gabay_zaourar_compute_bin_size(bin):
-    return (bin.name, beta_cpu*bin.cpu_free + beta_mem*bin.mem_free)
+""" values are (name, cpu, mem) tuples. The coeficients are given, as
+    global values are not seen by the pool's processes. """
+def _gabay_zaourar_compute_sizes(coeficient_cpu, coeficient_mem, values):
+    return [(name, coeficient_cpu*cpu + coeficient_mem*mem) for name, cpu, mem in values]
+
+def _numpy_sizes(coeficient, values):
+    if not values:
+        return {}
+    names, cpus, mems = zip(*values)
+    sizes = coeficient[0]*numpy.array(cpus) + coeficient[1]*numpy.array(mems)
+    return dict(zip(names, sizes.tolist()))
@@ -24,8 +24,15 @@
 
 import heapq
 import sys
+from math import ceil
 from multiprocessing import Pool
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from core.items_by_size import ItemsBySize
 from core.strategies import SchedulingStrategy
 
 
@@ -35,6 +42,16 @@ class GabayZaourarSlimAlgorithm(SchedulingStrategy):
         coeficient = self._config.params['bfd_measure_coeficient_function']
         self.processors_to_use = int(self._config.params['bfd_processors_to_use'])
         self.parallel_serial_threshold = int(self._config.params['bfd_parallel_serial_threshold'])
+        # sizes computation above the threshold: numpy or pool
+        self.parallel_backend = self._config.params.get('bfd_parallel_backend',
+                                                        'numpy' if numpy is not None else 'pool')
+        self.pool = None
+        if self.parallel_backend == 'pool':
+            # created once, it lives till the simulation is finished
+            self.pool = Pool(processes=self.processors_to_use)
+            self._config.statistics.add_listener('simulation_finished', self)
+        elif self.parallel_backend != 'numpy' or numpy is None:
+            raise Exception('Set bfd_parallel_backend param with one of these values: numpy (requires NumPy) or pool.')
         if coeficient == '1/C(j)':
             self.coeficient_function = frac_1_cj
         elif coeficient == '1/R(j)':
@@ -67,14 +84,14 @@ class GabayZaourarSlimAlgorithm(SchedulingStrategy):
         self.s_b = {}
 
         if len(bins) + len(items) > self.parallel_serial_threshold:
-            with Pool(processes=self.processors_to_use) as pool:
-                item_values = pool.map(_gabay_zaourar_compute_item_size, items)
-                for item_value in item_values:
-                    self.s_i[item_value[0]] = item_value[1]
-
-                bin_values = pool.map(_gabay_zaourar_compute_bin_size, bins)
-                for bin_value in bin_values:
-                    self.s_b[bin_value[0]] = bin_value[1]
+            item_values = [(item.name, item.cpu, item.mem) for item in items]
+            bin_values = [(bin.name, bin.cpu_free, bin.mem_free) for bin in bins]
+            if self.parallel_backend == 'pool':
+                self.s_i = self._pool_sizes(alpha, item_values)
+                self.s_b = self._pool_sizes(beta, bin_values)
+            else:
+                self.s_i = _numpy_sizes(alpha, item_values)
+                self.s_b = _numpy_sizes(beta, bin_values)
         else:
             for item in items:
                 self.s_i[item.name] = alpha_cpu*item.cpu + alpha_mem*item.mem
@@ -82,6 +99,19 @@ class GabayZaourarSlimAlgorithm(SchedulingStrategy):
             for bin in bins:
                 self.s_b[bin.name] = beta_cpu*bin.cpu_free + beta_mem*bin.mem_free
 
+    def _pool_sizes(self, coeficient, values):
+        chunk_size = max(ceil(len(values) / self.processors_to_use), 1)
+        chunks = [values[i:i+chunk_size] for i in range(0, len(values), chunk_size)]
+        sizes = {}
+        for chunk_sizes in self.pool.starmap(_gabay_zaourar_compute_sizes,
+                                             [(coeficient[0], coeficient[1], chunk) for chunk in chunks]):
+            sizes.update(chunk_sizes)
+        return sizes
+
+    def notify_event(self, event, *args, **kwargs):
+        if event == 'simulation_finished' and self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
 
     def get_biggest_item(self):
         return heapq.heappop(self._item_heap)[2] if len(self._item_heap) > 0 else None
@@ -96,13 +126,6 @@ class GabayZaourarSlimAlgorithm(SchedulingStrategy):
         except ValueError:
             return None
 
-    def get_biggest_feasible_item(self, items, bin):
-        feasible_items = (item for item in items if fits(item, bin))
-        try:
-            return max(feasible_items, key=self.size_of_item)
-        except ValueError:
-            return None
-
     def size_of_bin(self, bin):
         return self.s_b[bin.name]
 
@@ -144,33 +167,34 @@ class BFDBinCentricSlim(GabayZaourarSlimAlgorithm):
     def schedule_vms(self, vms):
         remaining_vms = self.schedule_vms_at_servers(vms, self._config.resource_manager.online_servers())
         if len(remaining_vms) > 0:
-            remaining_vms = self.schedule_vms_at_servers(vms, self._config.resource_manager.offline_servers(), active_bins=False)
+            remaining_vms = self.schedule_vms_at_servers(remaining_vms, self._config.resource_manager.offline_servers(), active_bins=False)
 
     def schedule_vms_at_servers(self, vms, bins, active_bins=True):
         list_of_bins = list(bins)
         unpacked_items = list(vms)
 
         self.compute_sizes(unpacked_items, list_of_bins)
-        self.initialize_bin_heap()
+        self.initialize_bin_heap(list_of_bins)
+        items_by_size = ItemsBySize(unpacked_items, self.size_of_item)
 
-        while len(list_of_bins) > 0:
-            smallest_bin = self.get_smallest_bin()
+        smallest_bin = self.get_smallest_bin()
+        while smallest_bin is not None:
             have_used_bin = False
 
-            item = self.get_biggest_feasible_item(unpacked_items, smallest_bin)
+            item = items_by_size.biggest_feasible(smallest_bin)
             while item is not None:
                 if not have_used_bin and not active_bins:
                     self._config.resource_manager.turn_on_server(smallest_bin.name)
 
                 self._config.resource_manager.schedule_vm_at_server(item, smallest_bin.name)
                 have_used_bin = True
-                unpacked_items.remove(item)
+                items_by_size.remove(item)
 
-                item = self.get_biggest_feasible_item(unpacked_items, smallest_bin)
+                item = items_by_size.biggest_feasible(smallest_bin)
 
-            list_of_bins.remove(smallest_bin)
+            smallest_bin = self.get_smallest_bin()
 
-        return unpacked_items
+        return [item for item in unpacked_items if item in items_by_size]
 
 
 def fits(item, bin):
@@ -198,8 +222,14 @@ def frac_rj_cj(items, bins):
 
 alpha_cpu = alpha_mem = beta_cpu = beta_mem = None
 
-def _gabay_zaourar_compute_item_size(item):
-    return (item.name, alpha_cpu*item.cpu + alpha_mem*item.mem)
-
-def _gabay_zaourar_compute_bin_size(bin):
-    return (bin.name, beta_cpu*bin.cpu_free + beta_mem*bin.mem_free)
+""" values are (name, cpu, mem) tuples. The coeficients are given, as
+    global values are not seen by the pool's processes. """
+def _gabay_zaourar_compute_sizes(coeficient_cpu, coeficient_mem, values):
+    return [(name, coeficient_cpu*cpu + coeficient_mem*mem) for name, cpu, mem in values]
+
+def _numpy_sizes(coeficient, values):
+    if not values:
+        return {}
+    names, cpus, mems = zip(*values)
+    sizes = coeficient[0]*numpy.array(cpus) + coeficient[1]*numpy.array(mems)
+    return dict(zip(names, sizes.tolist()))
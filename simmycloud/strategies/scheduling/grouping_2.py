@@ -24,9 +24,10 @@
 
 from operator import attrgetter
 from math import ceil, floor
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from core.strategies import SchedulingStrategy
+from core.first_fit_tree import FirstFitTree
 
 class GroupingVSVBP(SchedulingStrategy):
 
@@ -105,37 +106,41 @@ class GroupingVSVBP(SchedulingStrategy):
     def schedule_item_sets(self, item_sets, servers, should_turn_on_servers):
         #first fit
         scheduled_item_sets = []
+        servers_tree = FirstFitTree(servers)
         for item_set in item_sets:
-            for server in servers:
-                if GroupingVSVBP.fits(item_set, server):
-                    if should_turn_on_servers: self.guarantee_turned_on_server(server)
-                    for vm in item_set.items:
-                        self._config.resource_manager.schedule_vm_at_server(vm, server.name)
-                    scheduled_item_sets.append(item_set)
-                    break
+            server = servers_tree.first_fit(item_set.cpu, item_set.mem)
+            if server is not None:
+                if should_turn_on_servers: self.guarantee_turned_on_server(server)
+                for vm in item_set.items:
+                    self._config.resource_manager.schedule_vm_at_server(vm, server.name)
+                servers_tree.update(server)
+                scheduled_item_sets.append(item_set)
         return scheduled_item_sets
 
     def schedule_vms_directly(self, vms, servers, should_turn_on_servers):
         remaining_vms = []
         #first fit
+        servers_tree = FirstFitTree(servers)
         for vm in vms:
-            scheduled = False
-            for server in servers:
-                if vm.cpu <= server.cpu_free and vm.mem <= server.mem_free:
-                    if should_turn_on_servers: self.guarantee_turned_on_server(server)
-                    self._config.resource_manager.schedule_vm_at_server(vm, server.name)
-                    scheduled = True
-                    break
-            if not scheduled: remaining_vms.append(vm)
+            server = servers_tree.first_fit(vm.cpu, vm.mem)
+            if server is None:
+                remaining_vms.append(vm)
+                continue
+            if should_turn_on_servers:
+                self.guarantee_turned_on_server(server)
+                # servers is the offline servers' view, which loses the turned on server
+                servers_tree.remove(server)
+            self._config.resource_manager.schedule_vm_at_server(vm, server.name)
+            if server in servers_tree: servers_tree.update(server)
         return remaining_vms
 
     def merge_item_sets(self, resource_class):
-        for i in reversed(range(1, resource_class)):
-            for j in reversed(range(1, resource_class)):
-                for a in range(resource_class-i):
-                    for b in range(resource_class-j):
-                        self.vms_groups.merge(  self.vms_groups.group(i, j),
-                                                self.vms_groups.group(resource_class-i-a, resource_class-j-b) )
+        # only non-empty groups are merged, in decreasing order of classes
+        for group_a in self.vms_groups.non_empty_groups(resource_class-1, resource_class-1):
+            for group_b in self.vms_groups.non_empty_groups(resource_class-group_a.cpu_class,
+                                                            resource_class-group_a.mem_class):
+                if not group_a: break
+                self.vms_groups.merge(group_a, group_b)
 
     def guarantee_turned_on_server(self, server):
         if server.name not in self.servers_turned_on:
@@ -149,12 +154,16 @@ class GroupingVSVBP(SchedulingStrategy):
 
 
 class GroupsManager:
+    """ Groups of item sets, indexed by [cpu_class][mem_class]. The classes
+        of the non-empty groups are kept as bitmasks (a mask of cpu classes,
+        and a mask of mem classes for each cpu class), so that the empty
+        groups are skipped when merging. """
     def __init__(self, classifications):
         self.classifications = classifications
-        self.groups = {}
-        for i in range(1, self.classifications+1):
-            for j in range(1, self.classifications+1):
-                self.groups['{},{}'.format(i,j)] = Group(i, j)
+        self.groups = [[Group(i, j, self) for j in range(self.classifications+1)]
+                       for i in range(self.classifications+1)]
+        self._non_empty_cpu_classes = 0
+        self._non_empty_mem_classes = [0] * (self.classifications+1)
 
     def merge(self, group_a, group_b):
         destination_group = self.destination_group(group_a, group_b)
@@ -163,8 +172,8 @@ class GroupsManager:
         item_sets_to_merge = floor(len(group_a)/2) if group_a is group_b else min(len(group_a), len(group_b))
 
         for i in range(item_sets_to_merge):
-            a_item_set = group_a.pop()
-            b_item_set = group_b.pop()
+            a_item_set = group_a.pop_item_set()
+            b_item_set = group_b.pop_item_set()
             a_item_set.merge_with(b_item_set)
             destination_group.add_item_set(a_item_set)
 
@@ -175,60 +184,99 @@ class GroupsManager:
         return item_sets
 
     def groups_in_resource_class(self, resource_class):
-        groups = [self.groups['{},{}'.format(resource_class, resource_class)]]
+        groups = [self.groups[resource_class][resource_class]]
         for i in range(1, resource_class):
-            groups.append(self.groups['{},{}'.format(i, resource_class)])
-            groups.append(self.groups['{},{}'.format(resource_class, i)])
+            groups.append(self.groups[i][resource_class])
+            groups.append(self.groups[resource_class][i])
         return groups
 
+    """ Yields the non-empty groups with cpu_class <= max_cpu_class and
+        mem_class <= max_mem_class, from the greatest classes to the
+        smallest ones. The masks are read at each step, so groups filled
+        meanwhile are yielded if they come after the current one. """
+    def non_empty_groups(self, max_cpu_class, max_mem_class):
+        cpu_class = highest_class(self._non_empty_cpu_classes, max_cpu_class)
+        while cpu_class > 0:
+            mem_class = highest_class(self._non_empty_mem_classes[cpu_class], max_mem_class)
+            while mem_class > 0:
+                yield self.groups[cpu_class][mem_class]
+                mem_class = highest_class(self._non_empty_mem_classes[cpu_class], mem_class-1)
+            cpu_class = highest_class(self._non_empty_cpu_classes, cpu_class-1)
+
     def remove_item_sets(self, item_sets, resource_class):
-        groups = self.groups_in_resource_class(resource_class)
         for item_set in item_sets:
-            removed = False
-            for group in groups:
-                if item_set in group.item_sets:
-                    group.remove_item_set(item_set)
-                    removed = True
-                    break
-            if not removed:
+            group = item_set.group
+            if group is None or max(group.cpu_class, group.mem_class) != resource_class:
                 raise Exception('ItemSet not found to be removed at resource_class {}: ItemSet({}, {})'.format(
                     resource_class, item_set.cpu, item_set.mem))
+            group.remove_item_set(item_set)
 
     def group(self, cpu_class, mem_class):
-        return self.groups.get('{},{}'.format(cpu_class, mem_class))
+        if 0 < cpu_class <= self.classifications and 0 < mem_class <= self.classifications:
+            return self.groups[cpu_class][mem_class]
+        return None
 
     def destination_group(self, group_a, group_b):
         return self.group(  group_a.cpu_class + group_b.cpu_class,
                             group_a.mem_class + group_b.mem_class)
 
+    def group_filled(self, group):
+        self._non_empty_mem_classes[group.cpu_class] |= 1 << group.mem_class
+        self._non_empty_cpu_classes |= 1 << group.cpu_class
+
+    def group_emptied(self, group):
+        self._non_empty_mem_classes[group.cpu_class] &= ~(1 << group.mem_class)
+        if not self._non_empty_mem_classes[group.cpu_class]:
+            self._non_empty_cpu_classes &= ~(1 << group.cpu_class)
+
 
 class Group:
-    def __init__(self, cpu_class, mem_class):
-        self.item_sets = []
+    def __init__(self, cpu_class, mem_class, manager):
+        # ordered set of item sets: O(1) membership and removal
+        self.item_sets = OrderedDict()
         self.cpu_class = cpu_class
         self.mem_class = mem_class
+        self.manager = manager
 
     def add_item_sets(self, item_sets):
-        self.item_sets.extend(item_sets)
+        for item_set in item_sets:
+            self.add_item_set(item_set)
 
     def add_item_set(self, item_set):
-        self.item_sets.append(item_set)
+        self.item_sets[item_set] = None
+        item_set.group = self
+        if len(self.item_sets) == 1: self.manager.group_filled(self)
 
     def remove_item_set(self, item_set):
-        self.item_sets.remove(item_set)
+        del self.item_sets[item_set]
+        self._removed(item_set)
 
     def pop_item_set(self):
-        return self.item_sets.pop()
+        item_set = self.item_sets.popitem()[0]
+        self._removed(item_set)
+        return item_set
+
+    def _removed(self, item_set):
+        item_set.group = None
+        if not self.item_sets: self.manager.group_emptied(self)
 
     def __len__(self):
         return len(self.item_sets)
 
 
+""" Greatest class, up to max_class, whose bit is set at mask, or a value
+    <= 0 if there is none. """
+def highest_class(mask, max_class):
+    if max_class <= 0: return 0
+    return (mask & ((2 << max_class) - 1)).bit_length() - 1
+
+
 class ItemSet:
     def __init__(self, vm):
         self.items = [vm]
         self.cpu = vm.cpu
         self.mem = vm.mem
+        self.group = None
 
     def merge_with(self, item_set):
         self.items.extend(item_set.items)